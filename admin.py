@@ -1,12 +1,18 @@
-from telegram import ChatPermissions, Update
-from utils import extract_status_change, isAdmin, restricted
+import asyncio
+from typing import Optional
+
+from telegram import Bot, ChatPermissions, Update
+from historial import historial_mensajes
+from plantillas import BAN, DESBAN, DESRESTRINGIDO, mencion
+from utils import isAdmin, restricted
 from telegram.constants import ParseMode
+from telegram.error import TelegramError
 from telegram.ext import CallbackContext
 import logging 
 
 logger = logging.getLogger(__name__)
 
-@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto\.")
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
 async def ban_handler(update: Update, context: CallbackContext) -> None:
     if update.effective_chat is None:
         return
@@ -28,11 +34,11 @@ async def ban_handler(update: Update, context: CallbackContext) -> None:
         return
     target_user = reply_message.from_user
 
-    if not isAdmin(message_user.id):
+    if not await isAdmin(message_user.id, update.effective_chat):
         await update.effective_message.reply_text("solo los admins pueden banear.")
         return
     
-    if isAdmin(target_user.id):
+    if await isAdmin(target_user.id, update.effective_chat):
         await update.effective_message.reply_text("No puedes banear a un admin.")
         return
 
@@ -43,12 +49,12 @@ async def ban_handler(update: Update, context: CallbackContext) -> None:
         revoke_messages=False
     )
     await update.effective_message.reply_text(
-        f"Ban {target_user.mention_markdown_v2()}",
+        BAN(usuario=mencion(target_user)),
         parse_mode=ParseMode.MARKDOWN_V2
     )
-    logger.info(f"Banned user {target_user.id} from chat {update.effective_chat.id}")
+    logger.info("Banned user %s from chat %s", target_user.id, update.effective_chat.id)
 
-@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto\.")
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
 async def unban_handler(update: Update, context: CallbackContext) -> None:
     if update.effective_chat is None:
         return
@@ -68,11 +74,11 @@ async def unban_handler(update: Update, context: CallbackContext) -> None:
     if reply_message.from_user is None:
         return
     target_user = reply_message.from_user
-    if not isAdmin(message_user.id):
+    if not await isAdmin(message_user.id, update.effective_chat):
         await update.effective_message.reply_text("solo los admins pueden desbanear.")
         return
     
-    if isAdmin(target_user.id):
+    if await isAdmin(target_user.id, update.effective_chat):
         await update.effective_message.reply_text("No puedes desbanear a un admin.")
         return
     
@@ -82,13 +88,13 @@ async def unban_handler(update: Update, context: CallbackContext) -> None:
         only_if_banned=True
     )
     await update.effective_message.reply_text(
-        f"Desbaneado {target_user.mention_markdown_v2()}",
+        DESBAN(usuario=mencion(target_user)),
         parse_mode=ParseMode.MARKDOWN_V2
     )
-    logger.info(f"Unbanned user {target_user.id} from chat {update.effective_chat.id}")
+    logger.info("Unbanned user %s from chat %s", target_user.id, update.effective_chat.id)
 
 
-@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto\.")
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
 async def unrestrict_handler(update: Update, context: CallbackContext) -> None:
     if update.effective_chat is None:
         return
@@ -109,11 +115,11 @@ async def unrestrict_handler(update: Update, context: CallbackContext) -> None:
         return
     target_user = reply_message.from_user
 
-    if not isAdmin(message_user.id):
+    if not await isAdmin(message_user.id, update.effective_chat):
         await update.effective_message.reply_text("solo los admins pueden desbanear.")
         return
     
-    if isAdmin(target_user.id):
+    if await isAdmin(target_user.id, update.effective_chat):
         await update.effective_message.reply_text("No puedes desbanear a un admin.")
         return
     
@@ -126,7 +132,151 @@ async def unrestrict_handler(update: Update, context: CallbackContext) -> None:
         ),
     )
     await update.effective_message.reply_text(
-        f"no la líes más {target_user.mention_markdown_v2()}",
+        DESRESTRINGIDO(usuario=mencion(target_user)),
         parse_mode=ParseMode.MARKDOWN_V2
     )
-    logger.info(f"Unrestricted user {target_user.id} from chat {update.effective_chat.id}")
\ No newline at end of file
+    logger.info("Unrestricted user %s from chat %s", target_user.id, update.effective_chat.id)
+
+# Operaciones masivas
+
+# deleteMessages acepta como mucho 100 ids por llamada
+MAX_IDS_BORRADO = 100
+# Llamadas de borrado o baneo en vuelo a la vez por comando
+MAX_CONCURRENTES = 4
+# Límite del rango de /purgerange, para no lanzar miles de llamadas por error
+MAX_RANGO = 1000
+MAX_PURGA_USUARIO = 100
+
+
+async def borrar_mensajes(bot: Bot, chat_id: int, message_ids: list[int], **kwargs) -> int:
+    """Borra los mensajes en lotes de deleteMessages y devuelve cuántos lotes fallaron.
+
+    Los ids que ya no existen o no se pueden borrar se ignoran sin error.
+    """
+    ids = sorted(set(message_ids))
+    lotes = [ids[i:i + MAX_IDS_BORRADO] for i in range(0, len(ids), MAX_IDS_BORRADO)]
+    semaforo = asyncio.Semaphore(MAX_CONCURRENTES)
+
+    async def borrar_lote(lote: list[int]) -> bool:
+        async with semaforo:
+            try:
+                return await bot.delete_messages(chat_id, lote, **kwargs)
+            except TelegramError as e:
+                logger.error("No se pudieron borrar %s mensajes del chat %s: %s", len(lote), chat_id, e)
+                return False
+
+    resultados = await asyncio.gather(*(borrar_lote(lote) for lote in lotes))
+    return resultados.count(False)
+
+
+def _numero(args: Optional[list[str]], defecto: int, maximo: int) -> Optional[int]:
+    if not args:
+        return defecto
+    try:
+        n = int(args[0])
+    except ValueError:
+        return None
+    return n if 0 < n <= maximo else None
+
+
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+async def purge_handler(update: Update, context: CallbackContext) -> None:
+    """/purge [N] respondiendo a un mensaje: borra los últimos N mensajes de su autor."""
+    if update.effective_chat is None or update.effective_message is None:
+        return
+    reply_message = update.effective_message.reply_to_message
+    if reply_message is None or reply_message.from_user is None:
+        await update.effective_message.reply_text(
+            "Este comando necesita ser respondido a un mensaje"
+        )
+        return
+    n = _numero(context.args, 10, MAX_PURGA_USUARIO)
+    if n is None:
+        await update.effective_message.reply_text(f"Uso: /purge [1-{MAX_PURGA_USUARIO}]")
+        return
+
+    chat_id = update.effective_chat.id
+    target_user = reply_message.from_user
+    if await isAdmin(target_user.id, update.effective_chat):
+        await update.effective_message.reply_text("No puedes purgar a un admin.")
+        return
+
+    ids = historial_mensajes.ultimos(chat_id, target_user.id, n)
+    if reply_message.message_id not in ids:
+        ids.append(reply_message.message_id)
+    ids.append(update.effective_message.message_id)
+    fallos = await borrar_mensajes(context.bot, chat_id, ids)
+    historial_mensajes.olvidar(chat_id, target_user.id, ids)
+    logger.info(
+        "Purgados %s mensajes de %s en el chat %s (%s lotes fallidos)",
+        len(ids) - 1, target_user.id, chat_id, fallos
+    )
+
+
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+async def purge_range_handler(update: Update, context: CallbackContext) -> None:
+    """/purgerange respondiendo a un mensaje: borra desde ese mensaje hasta el comando.
+
+    También acepta los ids: /purgerange <desde> <hasta>
+    """
+    if update.effective_chat is None or update.effective_message is None:
+        return
+    message = update.effective_message
+    try:
+        if context.args and len(context.args) == 2:
+            desde, hasta = sorted(int(arg) for arg in context.args)
+        elif message.reply_to_message is not None:
+            desde, hasta = message.reply_to_message.message_id, message.message_id
+        else:
+            raise ValueError
+    except ValueError:
+        await message.reply_text(
+            "Uso: /purgerange respondiendo a un mensaje, o /purgerange <desde> <hasta>"
+        )
+        return
+    if hasta - desde + 1 > MAX_RANGO:
+        await message.reply_text(f"Como mucho {MAX_RANGO} mensajes a la vez.")
+        return
+
+    ids = list(range(desde, hasta + 1))
+    ids.append(message.message_id)
+    fallos = await borrar_mensajes(context.bot, update.effective_chat.id, ids)
+    logger.info(
+        "Purgados los mensajes %s-%s del chat %s (%s lotes fallidos)",
+        desde, hasta, update.effective_chat.id, fallos
+    )
+
+
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+async def ban_ids_handler(update: Update, context: CallbackContext) -> None:
+    """/banids <id> [<id> ...]: banea una lista de usuarios por id."""
+    if update.effective_chat is None or update.effective_message is None:
+        return
+    try:
+        user_ids = list(dict.fromkeys(int(arg) for arg in context.args or []))
+    except ValueError:
+        user_ids = []
+    if not user_ids:
+        await update.effective_message.reply_text("Uso: /banids <id> [<id> ...]")
+        return
+
+    chat = update.effective_chat
+    admins = [user_id for user_id in user_ids if await isAdmin(user_id, chat)]
+    objetivos = [user_id for user_id in user_ids if user_id not in admins]
+    semaforo = asyncio.Semaphore(MAX_CONCURRENTES)
+
+    async def banear(user_id: int) -> bool:
+        async with semaforo:
+            try:
+                return await chat.ban_member(user_id, revoke_messages=False)
+            except TelegramError as e:
+                logger.error("No se pudo banear a %s del chat %s: %s", user_id, chat.id, e)
+                return False
+
+    resultados = await asyncio.gather(*(banear(user_id) for user_id in objetivos))
+    baneados = resultados.count(True)
+    texto = f"Baneados {baneados} de {len(objetivos)} usuarios."
+    if admins:
+        texto += f" Ignorados {len(admins)} admins."
+    await update.effective_message.reply_text(texto)
+    logger.info("Baneo masivo en el chat %s: %s/%s", chat.id, baneados, len(objetivos))
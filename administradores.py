@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from telegram import Bot, ChatMember, Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from config import ADMINS_MAX_CHATS, ADMINS_TTL
+
+logger = logging.getLogger(__name__)
+
+_ESTADOS_ADMIN = (ChatMember.OWNER, ChatMember.ADMINISTRATOR)
+
+
+class CacheAdmins:
+    """Caché en memoria de los administradores de cada chat.
+
+    Los ids se obtienen con getChatAdministrators y se guardan como frozenset
+    durante ``ttl`` segundos. Si varias consultas del mismo chat llegan a la vez,
+    comparten una única llamada a la API. Los ascensos y degradaciones que llegan
+    como updates de ChatMember invalidan la entrada del chat, y también la
+    respuesta de una consulta que estuviera en curso, que ya puede no reflejarlos.
+
+    Las entradas caducadas no se borran: si la API falla, se usa la última lista
+    conocida en vez de tratar a los admins como usuarios normales. Se recuerdan
+    como mucho ``max_chats`` chats, olvidando primero el consultado hace más tiempo.
+    """
+
+    def __init__(self, ttl: float, max_chats: int = ADMINS_MAX_CHATS):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self.consultas = 0
+        # chat_id -> (caduca, ids de los administradores), de menos a más recientemente usado
+        self._entradas: OrderedDict[int, tuple[float, frozenset[int]]] = OrderedDict()
+        self._en_curso: dict[int, asyncio.Task] = {}
+
+    async def admins(self, bot: Bot, chat_id: int) -> frozenset[int]:
+        """Devuelve los ids de los administradores del chat."""
+        entrada = self._entradas.get(chat_id)
+        if entrada is not None:
+            self._entradas.move_to_end(chat_id)
+            if entrada[0] > time.monotonic():
+                return entrada[1]
+
+        tarea = self._en_curso.get(chat_id)
+        if tarea is None:
+            tarea = asyncio.create_task(self._consultar(bot, chat_id))
+            self._en_curso[chat_id] = tarea
+            tarea.add_done_callback(lambda t: self._terminada(chat_id, t))
+        # shield: si se cancela uno de los que esperan, la consulta sigue para los demás
+        return await asyncio.shield(tarea)
+
+    async def _consultar(self, bot: Bot, chat_id: int) -> frozenset[int]:
+        self.consultas += 1
+        try:
+            miembros = await bot.get_chat_administrators(chat_id)
+        except TelegramError as e:
+            # No se guarda nada: se vuelve a intentar en la próxima consulta
+            conocidos = self._conocidos(chat_id)
+            logger.error(
+                "No se pudieron obtener los admins del chat %s (se usa la última lista conocida: %s): %s",
+                chat_id, conocidos is not None, e,
+            )
+            return conocidos if conocidos is not None else frozenset()
+        ids = frozenset(miembro.user.id for miembro in miembros)
+        if self._en_curso.get(chat_id) is not asyncio.current_task():
+            # Se ha invalidado durante la consulta: la lista puede ser la de antes
+            # del cambio, así que se usa para esta respuesta pero no se guarda
+            logger.debug("Admins del chat %s invalidados durante la consulta", chat_id)
+            return ids
+        self._entradas[chat_id] = (time.monotonic() + self.ttl, ids)
+        self._entradas.move_to_end(chat_id)
+        while len(self._entradas) > self.max_chats:
+            self._entradas.popitem(last=False)
+        logger.debug("Admins del chat %s: %s", chat_id, len(ids))
+        return ids
+
+    def invalidar(self, chat_id: int) -> None:
+        entrada = self._entradas.get(chat_id)
+        if entrada is not None:
+            # Caducada, pero se conserva como última lista conocida
+            self._entradas[chat_id] = (0.0, entrada[1])
+        # Las consultas que lleguen a partir de ahora no esperan a la que está en
+        # curso, y esa ya no guardará su respuesta
+        self._en_curso.pop(chat_id, None)
+
+    def _conocidos(self, chat_id: int) -> Optional[frozenset[int]]:
+        entrada = self._entradas.get(chat_id)
+        return entrada[1] if entrada is not None else None
+
+    def _terminada(self, chat_id: int, tarea: asyncio.Task) -> None:
+        if self._en_curso.get(chat_id) is tarea:
+            del self._en_curso[chat_id]
+
+
+cache_admins = CacheAdmins(ADMINS_TTL)
+
+
+async def actualizar_admins(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Invalida la caché del chat cuando alguien asciende o deja de ser admin."""
+    cambio = update.chat_member or update.my_chat_member
+    if cambio is None:
+        return
+    era_admin = cambio.old_chat_member.status in _ESTADOS_ADMIN
+    es_admin = cambio.new_chat_member.status in _ESTADOS_ADMIN
+    if era_admin or es_admin:
+        # También cambian los permisos de un admin que sigue siéndolo
+        cache_admins.invalidar(cambio.chat.id)
+        logger.info("Admins del chat %s modificados, caché invalidada", cambio.chat.id)
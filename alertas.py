@@ -0,0 +1,161 @@
+import logging
+import random
+from collections import Counter
+from typing import Optional
+
+from telegram import Message, User
+from telegram.constants import ParseMode
+from telegram.ext import ContextTypes
+
+from config import ALERTAS_MAX_REENVIOS, ALERTAS_VENTANA
+from plantillas import (
+    ALERTA_CABECERA,
+    ALERTA_MENSAJE,
+    ALERTA_PALABRA,
+    ALERTA_SPAM,
+    Markdown,
+    escapar,
+    mencion,
+)
+from simhash import Duplicado
+from utils import ADMIN_CHAT_ID
+
+logger = logging.getLogger(__name__)
+
+# Enlaces a mensajes incluidos en cada resumen; el resto solo se cuentan
+MAX_ENLACES = 20
+
+
+def enlace_mensaje(message: Message) -> str:
+    """Enlace t.me al mensaje, incluido el tema si el grupo es un foro."""
+    message_group_id = int(str(message.chat.id).replace("-100", ""))
+    topic_id = ""
+    if message.chat.is_forum and message.message_thread_id is not None:
+        topic_id = f"/{message.message_thread_id}"
+    return f"https://t.me/c/{message_group_id}{topic_id}/{message.message_id}"
+
+
+class _Resumen:
+    __slots__ = ("titulo", "palabras", "spam", "usuarios", "chats", "enlaces", "muestra", "total")
+
+    def __init__(self, titulo: str):
+        self.titulo = titulo
+        self.palabras: Counter[str] = Counter()
+        # Mensajes de spam repetido, y los máximos de usuarios y chats que lo enviaron
+        self.spam = 0
+        self.usuarios = 0
+        self.chats = 0
+        self.enlaces: list[tuple[str, Markdown]] = []  # (enlace, mención del usuario)
+        self.muestra: list[int] = []  # ids de los mensajes que se reenvían
+        self.total = 0
+
+
+class AgregadorAlertas:
+    """Agrupa las alertas de palabras prohibidas y spam repetido en un resumen por chat.
+
+    El primer mensaje sospechoso de un chat abre una ventana de ``ventana``
+    segundos; los que llegan durante ella se acumulan y, al cerrarse, se envía al
+    chat de admins un único resumen con el recuento por palabra, los mensajes de
+    spam repetido y los enlaces a los mensajes, junto con un reenvío de una
+    muestra aleatoria de como mucho ``max_reenvios`` originales.
+    """
+
+    def __init__(self, ventana: float, max_reenvios: int):
+        self.ventana = ventana
+        self.max_reenvios = max_reenvios
+        self._pendientes: dict[int, _Resumen] = {}
+
+    def registrar(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        message: Message,
+        user: User,
+        palabras: list[str],
+        duplicado: Optional[Duplicado] = None,
+    ) -> None:
+        """Apunta un mensaje con palabras prohibidas o casi igual al de otros usuarios o chats."""
+        resumen = self._resumen(context, message)
+        resumen.palabras.update(palabras)
+        if duplicado is not None:
+            resumen.spam += 1
+            resumen.usuarios = max(resumen.usuarios, duplicado.usuarios)
+            resumen.chats = max(resumen.chats, duplicado.chats)
+        self._anotar(resumen, message, user)
+
+    def _resumen(self, context: ContextTypes.DEFAULT_TYPE, message: Message) -> _Resumen:
+        chat = message.chat
+        resumen = self._pendientes.get(chat.id)
+        if resumen is None:
+            resumen = self._pendientes[chat.id] = _Resumen(chat.title or "Grupo")
+            if context.job_queue is None:
+                logger.error("No hay JobQueue: no se pueden enviar los resúmenes de alertas")
+            else:
+                context.job_queue.run_once(
+                    self._enviar, self.ventana, chat_id=chat.id, name=f"alertas_{chat.id}"
+                )
+        return resumen
+
+    def _anotar(self, resumen: _Resumen, message: Message, user: User) -> None:
+        resumen.total += 1
+        if len(resumen.enlaces) < MAX_ENLACES:
+            resumen.enlaces.append((enlace_mensaje(message), mencion(user)))
+        # Muestreo de reservorio: cada mensaje tiene la misma probabilidad de reenviarse
+        if len(resumen.muestra) < self.max_reenvios:
+            resumen.muestra.append(message.message_id)
+        else:
+            i = random.randrange(resumen.total)
+            if i < self.max_reenvios:
+                resumen.muestra[i] = message.message_id
+
+    async def _enviar(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if context.job is None or context.job.chat_id is None:
+            return
+        chat_id = context.job.chat_id
+        resumen = self._pendientes.pop(chat_id, None)
+        if resumen is None:
+            return
+
+        texto = self._texto(resumen)
+        logger.info("Enviando resumen de %s alertas del chat %s", resumen.total, chat_id)
+        try:
+            # Una sola llamada para todos los reenvíos
+            await context.bot.forward_messages(ADMIN_CHAT_ID, chat_id, sorted(resumen.muestra))
+        except Exception as e:
+            logger.error("No se pudieron reenviar los mensajes del chat %s: %s", chat_id, e)
+        try:
+            await context.bot.send_message(
+                ADMIN_CHAT_ID, texto, parse_mode=ParseMode.MARKDOWN_V2, disable_web_page_preview=True
+            )
+        except Exception as e:
+            logger.error("No se pudo enviar el resumen de alertas del chat %s: %s", chat_id, e)
+
+    def _texto(self, resumen: _Resumen) -> str:
+        mensajes = "mensaje" if resumen.total == 1 else "mensajes"
+        lineas = [
+            ALERTA_CABECERA(
+                total=resumen.total, mensajes=mensajes, grupo=resumen.titulo, ventana=f"{self.ventana:g}"
+            ),
+        ]
+        if resumen.palabras:
+            lineas += ["", "Palabras:"]
+            for palabra, veces in resumen.palabras.most_common():
+                lineas.append(ALERTA_PALABRA(palabra=palabra, veces=veces))
+        if resumen.spam:
+            lineas += ["", "Spam repetido:"]
+            lineas.append(
+                ALERTA_SPAM(
+                    veces=resumen.spam,
+                    mensajes="mensaje" if resumen.spam == 1 else "mensajes",
+                    usuarios=resumen.usuarios,
+                    chats=resumen.chats,
+                )
+            )
+        lineas += ["", "Mensajes:"]
+        for enlace, usuario in resumen.enlaces:
+            lineas.append(ALERTA_MENSAJE(enlace=enlace, usuario=usuario))
+        if resumen.total > len(resumen.enlaces):
+            lineas.append(escapar(f"y {resumen.total - len(resumen.enlaces)} más"))
+        return "\n".join(lineas)
+
+
+agregador_alertas = AgregadorAlertas(ALERTAS_VENTANA, ALERTAS_MAX_REENVIOS)
@@ -0,0 +1,607 @@
+import datetime
+import time
+from typing import Optional, Union
+import instaloader
+import tempfile
+from contextlib import ExitStack
+from pathlib import Path
+import base64
+from telegram import (
+    Chat,
+    ChatPermissions,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    ChatMember,
+    ChatMemberUpdated,
+    Update,
+    User,
+    Message,
+    InlineQueryResultArticle,
+    InputFile,
+    InputMediaPhoto,
+    InputMediaVideo,
+    InputTextMessageContent,
+)
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+from telegram.ext import (
+    Application,
+    BaseRateLimiter,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    ConversationHandler,
+    MessageHandler,
+    CallbackContext,
+    ChatMemberHandler,
+    InlineQueryHandler,
+    PersistenceInput,
+    filters,
+)
+from telegram.request import BaseRequest
+from uuid import uuid4
+
+from admin import (
+    ban_handler,
+    ban_ids_handler,
+    purge_handler,
+    purge_range_handler,
+    unban_handler,
+    unrestrict_handler,
+)
+from administradores import actualizar_admins
+from alertas import agregador_alertas
+from bienvenidas import agrupador_bienvenidas
+from borrado import borrado_programado
+# Importar módulos personalizados
+from estados import DOWNLOAD_CHOOSING, DOWNLOADING
+from flood import detector_flood
+from historial import historial_mensajes
+from cache_media import FOTO, VIDEO, cache_media
+from config import BOT_MODE, DB_PATH, FLOOD_SILENCIO, SPAM_BORRAR, SPAM_CHATS
+from descargas import ColaLlena, pool_descargas
+from envios import BAJA, limitador_envios
+from instagram import download_instagram_post, extract_shortcode
+from metricas import RequestInstrumentado, registrar_metricas
+from palabras import filtro_palabras
+from persistencia import SQLitePersistence
+from plantillas import CHAT_ID, INICIO, MENSAJES_AUTOMATICOS, PLUS_20, REGLAS, mencion
+from procesador import procesador_updates
+from redirecciones import resolutor_redirecciones, resolver_acortados
+from registro import logger_mensajes
+from simhash import comprobar_duplicado
+from urls import analizar_mensaje
+from utils import extract_status_change, instrumentar_handlers, isAdmin, restricted, seccion
+
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+
+# Función para manejar el comando /start
+async def start_handler(update: Update, context: CallbackContext) -> None:
+    user = update.effective_user
+
+    if user is None or update.message is None:
+        return
+
+    logger.info("El usuario %s ha iniciado una conversación.", user.first_name)
+    await update.message.reply_text(INICIO(usuario=mencion(user)), parse_mode=ParseMode.MARKDOWN_V2)
+
+
+async def greet_new_member(update: Update, context: CallbackContext) -> None:
+    if (
+        update.chat_member is None
+        or update.chat_member.new_chat_member is None
+        or update.effective_chat is None
+    ):
+        return
+
+    result = extract_status_change(update.chat_member)
+    if result is None:
+        logger.info("No se detectó un cambio en el estado del miembro.")
+        return
+
+    was_member, is_member = result
+    cause_name = update.chat_member.from_user.name
+    member_name = update.chat_member.new_chat_member.user.name
+    member_id = update.chat_member.new_chat_member.user.id
+    logger.info(
+        "El estado del miembro %s (id: %s) ha cambiado de %s a %s. Causado por %s.",
+        member_name, member_id, was_member, is_member, cause_name
+    )
+    # Saludar si el usuario pasó de no ser miembro a ser miembro
+    if not was_member and is_member:
+        # Las entradas se agrupan en una sola bienvenida por chat
+        agrupador_bienvenidas.registrar(
+            context, update.effective_chat.id, update.chat_member.new_chat_member.user
+        )
+    elif was_member and not is_member:
+        logger.warning("Despidiendo a %s por salir del grupo.", member_name)
+
+
+async def rules_handler(update: Update, context: CallbackContext) -> None:
+    user = update.effective_user
+    if user is None or update.message is None:
+        return
+    rules_message = await update.message.reply_text(REGLAS, parse_mode=ParseMode.MARKDOWN_V2)
+
+    # Programar la eliminación del mensaje después de 10 minutos
+    if update.effective_chat is None:
+        return
+    delete_time = 10 * 60  # 10 minutos en segundos
+    borrado_programado.programar(update.effective_chat.id, rules_message.message_id, delete_time)
+    logger.info(
+        "Programada eliminación automática del mensaje de reglas en %s segundos", delete_time
+    )
+
+
+
+CAPTION_INSTAGRAM = "Contenido descargado de Instagram"
+# Máximo de elementos por álbum que admite sendMediaGroup
+MAX_ALBUM = 10
+
+
+async def reply_media(
+    message: Message, medios: list[tuple[str, Union[str, Path]]]
+) -> list[tuple[str, str]]:
+    """Envía fotos y videos como respuesta al mensaje, agrupados en álbumes
+
+    Cada elemento es (tipo, media), donde media es un file_id ya subido o la ruta
+    de un fichero local. Los ficheros se suben leyendo del disco en streaming y
+    sus manejadores se cierran en cuanto termina el envío.
+
+    Returns:
+        list[tuple[str, str]]: Lista de (tipo, file_id) de los medios enviados
+    """
+    enviados = []
+    with ExitStack() as ficheros:
+
+        def preparar(media: Union[str, Path], attach: bool) -> Union[str, InputFile]:
+            if isinstance(media, Path):
+                return InputFile(
+                    ficheros.enter_context(media.open("rb")),
+                    filename=media.name,
+                    attach=attach,
+                    read_file_handle=False,
+                )
+            return media
+
+        for inicio in range(0, len(medios), MAX_ALBUM):
+            grupo = medios[inicio : inicio + MAX_ALBUM]
+            caption = CAPTION_INSTAGRAM if inicio == 0 else None
+            if len(grupo) == 1:
+                tipo, media = grupo[0]
+                if tipo == FOTO:
+                    sent = [await message.reply_photo(photo=preparar(media, False), caption=caption)]
+                else:
+                    sent = [await message.reply_video(video=preparar(media, False), caption=caption)]
+            else:
+                album = [
+                    (InputMediaPhoto if tipo == FOTO else InputMediaVideo)(
+                        media=preparar(media, True), caption=caption if i == 0 else None
+                    )
+                    for i, (tipo, media) in enumerate(grupo)
+                ]
+                sent = await message.reply_media_group(media=album)
+
+            for msg in sent:
+                if msg.photo:
+                    enviados.append((FOTO, msg.photo[-1].file_id))
+                elif msg.video is not None:
+                    enviados.append((VIDEO, msg.video.file_id))
+    return enviados
+
+
+async def send_instagram_post(message: Message, url: str) -> None:
+    """Descarga un post de Instagram y lo envía como respuesta al mensaje original"""
+    shortcode = extract_shortcode(url)
+    if shortcode is None:
+        return
+
+    # Si el post ya se envió antes, se reenvían sus file_ids sin descargar ni subir nada
+    medios = await cache_media.get(shortcode)
+    if medios is not None:
+        logger.info("Post de Instagram %s servido desde la caché", shortcode)
+        await reply_media(message, medios)
+        return
+
+    try:
+        post = await download_instagram_post(url)
+    except ColaLlena:
+        await message.reply_text(
+            "Hay demasiadas descargas en curso, inténtalo de nuevo en unos minutos."
+        )
+        return
+
+    if post is None or not post.archivos:
+        if post is not None:
+            post.limpiar()
+        await message.reply_text(
+            "Lo siento, no pude descargar el contenido de Instagram."
+        )
+        return
+
+    # El directorio temporal se borra cuando termina la subida
+    with post:
+        medios = await reply_media(
+            message,
+            [
+                (FOTO if mime_type.startswith("image/") else VIDEO, ruta)
+                for ruta, mime_type in post.archivos
+            ],
+        )
+
+    await cache_media.put(shortcode, medios)
+
+
+async def silenciar_por_flood(chat: Chat, user: User) -> bool:
+    """Restringe durante FLOOD_SILENCIO segundos a un usuario que hace flood.
+
+    Devuelve True si se le ha silenciado (los admins nunca se silencian).
+    """
+    if await isAdmin(user.id, chat):
+        return False
+    # Para no volver a restringirle por los mensajes que ya estén en camino
+    detector_flood.reiniciar(chat.id, user.id)
+    try:
+        await chat.restrict_member(
+            user.id,
+            ChatPermissions(can_send_messages=False),
+            until_date=int(time.time() + FLOOD_SILENCIO),
+        )
+    except TelegramError as e:
+        logger.error("No se pudo silenciar al usuario %s por flood: %s", user.id, e)
+        return False
+    logger.warning(
+        "Usuario %s (id: %s) silenciado %gs por flood en el chat %s",
+        user.first_name, user.id, FLOOD_SILENCIO, chat.id
+    )
+    return True
+
+
+async def all_messages_handler(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+
+    if update.effective_message is None:
+        return
+
+    if update.effective_user is None:
+        return
+    user = update.effective_user
+    message_text = update.effective_message.text
+
+    logger_mensajes.info(
+        "El usuario %s (id: %s) ha enviado un mensaje.",
+        user.first_name,
+        user.id,
+        extra={"chat_id": update.effective_chat.id if update.effective_chat else None, "user_id": user.id},
+    )
+
+    # Para poder purgar después los mensajes del usuario (/purge)
+    historial_mensajes.registrar(
+        update.effective_message.chat_id,
+        user.id,
+        update.effective_message.message_id,
+        message_text or update.effective_message.caption,
+    )
+
+    # Antiflood: se comprueba con cualquier tipo de mensaje, no solo texto
+    chat = update.effective_chat
+    if chat is not None and chat.type != Chat.PRIVATE:
+        if detector_flood.registrar(chat.id, user.id) and await silenciar_por_flood(chat, user):
+            return
+
+    if message_text is None:
+        return
+
+    # Spam repetido: el mismo texto, con pequeños cambios, en muchos chats o de muchos usuarios
+    duplicado = None
+    borrado = False
+    if chat is not None and chat.type != Chat.PRIVATE:
+        with seccion("huellas"):
+            duplicado = comprobar_duplicado(update, chat.id, user.id, message_text)
+        if duplicado is not None and await isAdmin(user.id, chat):
+            duplicado = None
+        if duplicado is not None:
+            logger.warning(
+                "Spam repetido de %s (id: %s) en el chat %s: enviado por %s usuarios en %s chats",
+                user.first_name, user.id, chat.id, duplicado.usuarios, duplicado.chats
+            )
+            # Muchos usuarios de un mismo chat pueden repetir un saludo o un aviso;
+            # solo se borra lo que se ha enviado en varios chats, y si se pide
+            if SPAM_BORRAR and duplicado.chats >= SPAM_CHATS:
+                try:
+                    await update.effective_message.delete()
+                    borrado = True
+                except TelegramError as e:
+                    logger.error("No se pudo borrar el spam repetido del usuario %s: %s", user.id, e)
+
+    # Extraer y clasificar todos los enlaces del mensaje en una sola pasada
+    with seccion("urls"):
+        enlaces = analizar_mensaje(update.effective_message)
+    if enlaces.otros:
+        # Los enlaces acortados se clasifican por su destino
+        with seccion("redirecciones"):
+            enlaces = await resolver_acortados(enlaces)
+    if enlaces:
+        logger_mensajes.info(
+            "Usuario %s ha enviado un mensaje con enlaces: %s",
+            user.first_name,
+            enlaces.urls,
+            extra={"chat_id": update.effective_chat.id if update.effective_chat else None, "user_id": user.id},
+        )
+
+    if enlaces.bloqueados and not await isAdmin(user.id, update.effective_chat):
+        try:
+            if update.effective_chat is None:
+                return
+            if not borrado:
+                await update.effective_message.delete()
+            await update.effective_chat.ban_member(
+                user.id, until_date=None, revoke_messages=False  # type: ignore
+            )
+            logger.warning(
+                "Usuario %s (id: %s) baneado por enviar enlaces bloqueados: %s",
+                user.first_name, user.id, enlaces.bloqueados
+            )
+        except Exception as e:
+            logger.error("No se pudo banear al usuario %s: %s", user.id, e)
+        return
+
+    # Las descargas se hacen en segundo plano para no retrasar el resto de updates
+    if not borrado:
+        for url_instagram in enlaces.instagram:
+            context.application.create_task(
+                send_instagram_post(update.effective_message, url_instagram), update=update
+            )
+
+    # Palabras baneadas
+    with seccion("palabras"):
+        palabras = filtro_palabras.buscar(message_text)
+    if palabras:
+        palabra = ", ".join(palabras)
+        # encoded_text = f"WRD: {palabra} UID: {user.id} UNM: {user.username}"
+        # Codificar el texto en base64
+        # encoded_b64 = base64.b64encode(encoded_text.encode()).decode()
+
+        # Borrar el mensaje original
+        # if update.effective_chat is not None:
+        #     try:
+        #         await update.effective_chat.delete_message(update.effective_message.message_id)
+        #         logger.info(f"Mensaje con palabra prohibida borrado: {palabra}")
+        #     except Exception as e:
+        #         logger.error(f"No se pudo borrar el mensaje: {e}")
+
+        # Enviar la notificación
+        # await update.effective_message.reply_text(
+        #     f"Ojo que te cojo\. @diidinaeg \n `@{bot_username} {encoded_b64}`",  # type: ignore
+        #     parse_mode=ParseMode.MARKDOWN_V2,
+        #     disable_web_page_preview=True,
+        # )
+
+        logger.warning(
+            "El usuario %s (id: %s @%s) ha enviado un mensaje que contiene una palabra prohibida: %s.",
+            user.first_name, user.id, user.username, palabra
+        )
+    if palabras or duplicado is not None:
+        if update.effective_chat is None or update.effective_message is None:
+            return
+        # Las alertas se agrupan en un resumen por chat en lugar de reenviar cada mensaje
+        agregador_alertas.registrar(context, update.effective_message, user, palabras, duplicado)
+
+# Función para enviar mensajes automáticos cada 13 horas
+
+async def callback_auto_message(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Envía un mensaje automático usando el chat_id almacenado en job.data"""
+    if context.job is None or context.job.chat_id is None:
+        return
+    chat_id = context.job.chat_id  # En v20+ se usa job.data en lugar de context
+    # Enviar mensaje aleatorio de la lista MENSAJES_INTERVALOS
+    # Ya escapados al arrancar
+    mensaje = random.choice(MENSAJES_AUTOMATICOS)
+    if chat_id is None:
+        logger.error("No se encontró el chat_id en el job.")
+        return
+    logger.info("Enviando mensaje automático al chat %s: %s", chat_id, mensaje)
+    await context.bot.send_message(
+        chat_id=chat_id, text=mensaje, parse_mode=ParseMode.MARKDOWN_V2, rate_limit_args=BAJA
+    )
+
+
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+async def start_auto_messaging(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Inicia el envío de mensajes automáticos"""
+    logger.info("Iniciando mensajes automáticos")
+    if (
+        update.effective_chat is None
+        or update.effective_message is None
+        or context.job_queue is None
+    ):
+        return
+    chat_id = update.effective_message.chat.id
+    intervalo = 60 * 60 * 13
+    # check if the user is an admin
+    context.job_queue.run_repeating(
+        callback_auto_message, intervalo, chat_id=chat_id, name=str(chat_id)
+    )
+    logger.info("Job creado para enviar mensajes automáticos a %s", chat_id)
+    # Alternativas comentadas:
+    # context.job_queue.run_once(callback_auto_message, 3600, data=chat_id)
+    # context.job_queue.run_daily(callback_auto_message, time=datetime.time(hour=9, minute=22), days=(0, 1, 2, 3, 4, 5, 6), data=chat_id)
+
+    await update.effective_message.reply_text("¡Mensajes automáticos iniciados!")
+
+
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+async def stop_notify(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Detiene el envío de mensajes automáticos"""
+    if update.effective_chat is None or update.message is None:
+        return
+
+    chat_id = update.effective_chat.id
+    if context.job_queue is None:
+        return
+    jobs = context.job_queue.get_jobs_by_name(str(chat_id))
+
+    if jobs:
+        for job in jobs:
+            job.schedule_removal()
+        await update.message.reply_text("¡Mensajes automáticos detenidos!")
+    else:
+        await update.message.reply_text("No hay mensajes automáticos activos.")
+
+
+
+# @restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+# async def decode_base64(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+#     """Decodifica un texto en base64"""
+#     if update.effective_user is None or update.message is None:
+#         return
+#     if context.args is None or len(context.args) == 0:
+#         await update.message.reply_text("Uso: /decode [texto_base64]")
+#         return
+
+#     encoded_text = " ".join(context.args)
+#     try:
+#         decoded_text = base64.b64decode(encoded_text.encode()).decode("utf-8")
+#         await update.message.reply_text(
+#             f"Texto decodificado:\n`{decoded_text}`", parse_mode=ParseMode.MARKDOWN_V2
+#         )
+#     except Exception as e:
+#         await update.message.reply_text(f"Error al decodificar: {str(e)}")
+
+
+@restricted(reply=True, custom_message="Solo los admins pueden ejecutar esto tonto.")
+async def inline_query_handler(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Maneja consultas inline para decodificar base64"""
+    if update.inline_query is None or update.inline_query.query is None:
+        return
+    query = update.inline_query.query
+
+    if not query:
+        return
+
+    results = []
+    try:
+        # Intentar decodificar el texto en base64
+        decoded_text = base64.b64decode(query.encode()).decode("utf-8")
+        results.append(
+            InlineQueryResultArticle(
+                id=str(uuid4()),
+                title="Decodificar Base64",
+                input_message_content=InputTextMessageContent(
+                    PLUS_20, parse_mode=ParseMode.MARKDOWN_V2
+                ),
+                description=(
+                    f"Resultado: {decoded_text[:15]}..."
+                    if len(decoded_text) > 50
+                    else f"Resultado: {decoded_text}"
+                ),
+            )
+        )
+    except Exception as e:
+        results.append(
+            InlineQueryResultArticle(
+                id=str(uuid4()),
+                title="Error al decodificar",
+                input_message_content=InputTextMessageContent(
+                    "No se pudo decodificar el texto en base64."
+                ),
+                description="El texto proporcionado no es un base64 válido.",
+            )
+        )
+
+    await update.inline_query.answer(results, is_personal=True, cache_time=0)
+
+async def chatid_handler(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Maneja el comando /chatid"""
+    if update.effective_chat is None or update.effective_message is None:
+        return
+
+    chat_id = update.effective_chat.id
+    await update.effective_message.reply_text(CHAT_ID(chat_id=chat_id), parse_mode=ParseMode.MARKDOWN_V2)
+
+async def cerrar(application: Application) -> None:
+    """Escribe lo que queda pendiente en SQLite y cierra el cliente HTTP y el pool de descargas."""
+    await cache_media.guardar()
+    await borrado_programado.guardar()
+    await resolutor_redirecciones.cerrar()
+    pool_descargas.shutdown()
+
+
+def build_application(
+    token: str,
+    request: Optional[BaseRequest] = None,
+    rate_limiter: Optional[BaseRateLimiter] = limitador_envios,
+    recibir_updates: bool = True,
+    store_data: Optional[PersistenceInput] = None,
+) -> Application:
+    """Crea la aplicación del bot con la persistencia y todos los manejadores
+
+    ``request`` y ``rate_limiter`` permiten sustituir la conexión con Telegram,
+    p. ej. en benchmarks/bench_replay.py. Con ``recibir_updates=False`` no se
+    crea el Updater: los updates los pone otro en la cola (ver sharding.py).
+    ``store_data`` indica qué datos guarda la persistencia (por defecto, todos).
+    """
+    # Para migrar los datos de persistence.pkl: python migrar_pickle.py
+    persistence_helper = SQLitePersistence(filepath=DB_PATH, store_data=store_data)
+
+    builder = (
+        Application.builder()
+        .token(token)
+        .persistence(persistence=persistence_helper)
+        .request(request or RequestInstrumentado(connection_pool_size=256))
+        # Chats distintos en paralelo, cada chat en orden
+        .update_queue(procesador_updates.cola)
+        .concurrent_updates(procesador_updates)
+        .post_stop(cerrar)
+    )
+    if rate_limiter is not None:
+        # Todas las llamadas a la API pasan por el planificador de envíos
+        builder = builder.rate_limiter(rate_limiter)
+    if BOT_MODE == "webhook" or not recibir_updates:
+        # Los updates llegan por el servidor HTTP, no hace falta el Updater
+        builder = builder.updater(None)
+    application = builder.build()
+
+    # Añadir manejador para el comando /start
+    application.add_handler(CommandHandler("start", start_handler))
+    application.add_handler(CommandHandler("rules", rules_handler)) 
+    application.add_handler(CommandHandler("ban", ban_handler))
+    application.add_handler(CommandHandler("unban", unban_handler))
+    application.add_handler(CommandHandler("unrestrict", unrestrict_handler))
+    application.add_handler(CommandHandler("purge", purge_handler))
+    application.add_handler(CommandHandler("purgerange", purge_range_handler))
+    application.add_handler(CommandHandler("banids", ban_ids_handler))
+    application.add_handler(CommandHandler("chatid", chatid_handler))
+    application.add_handler(
+        ChatMemberHandler(greet_new_member, ChatMemberHandler.CHAT_MEMBER)
+    )  # Se completa el ChatMemberHandler para saludar a nuevos usuarios
+    # En su propio grupo para que se ejecute también cuando saluda greet_new_member
+    application.add_handler(
+        ChatMemberHandler(actualizar_admins, ChatMemberHandler.ANY_CHAT_MEMBER), group=1
+    )
+
+    # Añadir manejador para consultas inline
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+
+    application.add_handler(CommandHandler("auto", start_auto_messaging))
+    application.add_handler(CommandHandler("stop", stop_notify))
+    application.add_handler(MessageHandler(filters.ALL, all_messages_handler))
+
+    if application.job_queue is not None:
+        borrado_programado.iniciar(application.job_queue)
+
+    # Antes de registrar_metricas, para no medir el contador de updates
+    instrumentar_handlers(application)
+    registrar_metricas(application)
+    return application
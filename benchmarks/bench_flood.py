@@ -0,0 +1,70 @@
+"""Benchmark del detector de flood.
+
+Simula 100.000 usuarios activos repartidos en 50 chats enviando mensajes con
+tiempos sintéticos, y mide mensajes por segundo, memoria usada y detecciones.
+Un pequeño grupo de usuarios hace flood a propósito.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_flood
+"""
+
+import random
+import time
+import tracemalloc
+
+from flood import DetectorFlood
+
+USUARIOS = 100_000
+CHATS = 50
+NUM_MENSAJES = 1_000_000
+FLOODERS = 10
+MAX_MENSAJES = 8
+VENTANA = 10.0
+
+rng = random.Random(1234)
+
+
+def generar_mensajes() -> list[tuple[int, int, float]]:
+    # Unos 2.000 mensajes por segundo en total; cada flooder envía unos 2 por segundo
+    mensajes = []
+    ahora = 0.0
+    for i in range(NUM_MENSAJES):
+        ahora += 0.0005
+        if i % 100 == 0:
+            user_id = rng.randrange(FLOODERS)
+        else:
+            user_id = rng.randrange(FLOODERS, USUARIOS)
+        mensajes.append((-1000 - user_id % CHATS, user_id, ahora))
+    return mensajes
+
+
+def main() -> None:
+    mensajes = generar_mensajes()
+    print(f"{USUARIOS} usuarios, {NUM_MENSAJES} mensajes, límite {MAX_MENSAJES} en {VENTANA:g}s")
+    for capacidad in [USUARIOS, USUARIOS // 2]:
+        detector = DetectorFlood(MAX_MENSAJES, VENTANA, capacidad)
+        registrar = detector.registrar
+        detectados = set()
+        inicio = time.perf_counter()
+        for chat_id, user_id, ahora in mensajes:
+            if registrar(chat_id, user_id, ahora):
+                detectados.add(user_id)
+        duracion = time.perf_counter() - inicio
+
+        # La memoria se mide aparte: tracemalloc ralentiza mucho el bucle
+        tracemalloc.start()
+        detector = DetectorFlood(MAX_MENSAJES, VENTANA, capacidad)
+        for chat_id, user_id, ahora in mensajes[: 2 * capacidad]:
+            detector.registrar(chat_id, user_id, ahora)
+        memoria, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        falsos = len([u for u in detectados if u >= FLOODERS])
+        print(
+            f"capacidad {capacidad:>7}: {NUM_MENSAJES / duracion:>10,.0f} msg/s, "
+            f"memoria {memoria / 2**20:6.1f} MiB, {len(detectados) - falsos}/{FLOODERS} flooders "
+            f"detectados, {falsos} falsos positivos"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark del filtro de palabras prohibidas.
+
+Mide mensajes por segundo con listas de 10, 1.000 y 50.000 términos y lo
+compara con el recorrido término a término que hacía antes all_messages_handler.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_palabras
+"""
+
+import random
+import string
+import time
+
+from palabras import FiltroPalabras
+
+TAMANOS = [10, 1_000, 50_000]
+NUM_MENSAJES = 5_000
+# El método antiguo es O(términos) por mensaje; con listas grandes se limita
+# el número de mensajes para que el benchmark termine en un tiempo razonable.
+PRESUPUESTO_ANTIGUO = 200_000
+
+rng = random.Random(1234)
+
+
+def palabra_aleatoria() -> str:
+    return "".join(rng.choices(string.ascii_lowercase + "áéíóñ", k=rng.randint(2, 10)))
+
+
+def generar_terminos(n: int) -> list[str]:
+    terminos = set()
+    while len(terminos) < n:
+        if rng.random() < 0.2:
+            terminos.add(" ".join(palabra_aleatoria() for _ in range(rng.randint(2, 3))))
+        else:
+            terminos.add(palabra_aleatoria())
+    return list(terminos)
+
+
+def generar_mensajes(terminos: list[str], n: int) -> list[str]:
+    mensajes = []
+    for _ in range(n):
+        palabras = [palabra_aleatoria() for _ in range(rng.randint(5, 40))]
+        # Uno de cada diez mensajes contiene un término prohibido
+        if rng.random() < 0.1:
+            palabras.insert(rng.randrange(len(palabras)), rng.choice(terminos).upper())
+        mensajes.append(" ".join(palabras) + rng.choice(["", ".", "?", "!"]))
+    return mensajes
+
+
+def buscar_antiguo(palabras_baneadas: list[str], message_text: str) -> list[str]:
+    encontrados = []
+    for palabra in palabras_baneadas:
+        if (
+            palabra.lower()
+            in message_text.lower()
+            .replace("?", " ")
+            .replace(".", " ")
+            .replace(",", " ")
+            .split()
+        ):
+            encontrados.append(palabra)
+    return encontrados
+
+
+def medir(funcion, mensajes: list[str]) -> float:
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        funcion(mensaje)
+    return len(mensajes) / (time.perf_counter() - inicio)
+
+
+def main() -> None:
+    print(f"{'términos':>10} {'compilación (s)':>16} {'msg/s filtro':>14} {'msg/s antiguo':>14}")
+    for tamano in TAMANOS:
+        terminos = generar_terminos(tamano)
+        mensajes = generar_mensajes(terminos, NUM_MENSAJES)
+
+        inicio = time.perf_counter()
+        filtro = FiltroPalabras(terminos)
+        compilacion = time.perf_counter() - inicio
+
+        velocidad = medir(filtro.buscar, mensajes)
+        velocidad_antigua = medir(
+            lambda m: buscar_antiguo(terminos, m),
+            mensajes[: max(20, PRESUPUESTO_ANTIGUO // tamano)],
+        )
+        print(f"{tamano:>10} {compilacion:>16.3f} {velocidad:>14,.0f} {velocidad_antigua:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark del volcado de persistencia.
+
+Compara la latencia de un volcado periódico (update_persistence de la
+aplicación) con PicklePersistence y con SQLitePersistence para 10.000 y
+100.000 usuarios, cuando solo una parte de ellos ha cambiado.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_persistencia
+"""
+
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from telegram.ext import ExtBot, PicklePersistence
+
+from persistencia import SQLitePersistence
+
+TAMANOS = [10_000, 100_000]
+CAMBIADOS = 200  # usuarios modificados entre dos volcados
+VOLCADOS = 5
+
+rng = random.Random(1234)
+
+
+def datos_usuario(user_id: int) -> dict:
+    return {"id": user_id, "avisos": rng.randint(0, 5), "idioma": "es", "ultimo": time.time()}
+
+
+async def volcar(persistencia, usuarios: dict[int, dict], cambiados: list[int]) -> None:
+    # Lo mismo que hace Application.update_persistence con los usuarios modificados
+    for user_id in cambiados:
+        usuarios[user_id] = datos_usuario(user_id)
+        await persistencia.update_user_data(user_id, dict(usuarios[user_id]))
+
+
+async def medir_pickle(ruta: Path, usuarios: dict[int, dict]) -> float:
+    # on_flush=True es el caso más favorable: un único volcado del fichero por intervalo
+    persistencia = PicklePersistence(filepath=ruta, on_flush=True)
+    persistencia.set_bot(ExtBot("123:abc"))
+    persistencia.user_data = dict(usuarios)
+
+    tiempos = []
+    for _ in range(VOLCADOS):
+        cambiados = rng.sample(list(usuarios), CAMBIADOS)
+        inicio = time.perf_counter()
+        await volcar(persistencia, usuarios, cambiados)
+        await persistencia.flush()
+        tiempos.append(time.perf_counter() - inicio)
+    return sum(tiempos) / len(tiempos)
+
+
+async def medir_sqlite(ruta: Path, usuarios: dict[int, dict]) -> float:
+    persistencia = SQLitePersistence(filepath=str(ruta))
+    for user_id, datos in usuarios.items():
+        await persistencia.update_user_data(user_id, datos)
+    await persistencia.flush()
+
+    persistencia = SQLitePersistence(filepath=str(ruta))
+    await persistencia.get_user_data()
+    tiempos = []
+    for _ in range(VOLCADOS):
+        cambiados = rng.sample(list(usuarios), CAMBIADOS)
+        inicio = time.perf_counter()
+        await volcar(persistencia, usuarios, cambiados)
+        await persistencia._escribir()
+        tiempos.append(time.perf_counter() - inicio)
+    await persistencia.flush()
+    return sum(tiempos) / len(tiempos)
+
+
+async def main() -> None:
+    print(f"Volcado de {CAMBIADOS} usuarios modificados (media de {VOLCADOS} volcados)")
+    print(f"{'usuarios':>10} {'pickle (ms)':>12} {'sqlite (ms)':>12}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for tamano in TAMANOS:
+            usuarios = {user_id: datos_usuario(user_id) for user_id in range(tamano)}
+            pickle_ms = 1000 * await medir_pickle(Path(directorio) / f"{tamano}.pkl", usuarios)
+            sqlite_ms = 1000 * await medir_sqlite(Path(directorio) / f"{tamano}.db", usuarios)
+            print(f"{tamano:>10} {pickle_ms:>12.1f} {sqlite_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
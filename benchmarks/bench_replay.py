@@ -0,0 +1,314 @@
+"""Benchmark de los manejadores reproduciendo updates sin conexión.
+
+Pasa updates de Telegram (sintéticos o grabados) por la Application real que
+crea aplicacion.build_application, con un Bot cuyas peticiones no salen a la
+red: cada llamada a la API se registra y se responde con un resultado plausible.
+Los updates entran por update_queue, como los del Updater o el webhook, así
+que pasan por ProcesadorPorChat y el planificador de envíos. Mide updates por
+segundo, la latencia p50/p99 de cada update (desde que se pone en la cola) y
+los bloques de memoria que asigna cada uno.
+
+El planificador de envíos funciona sin límites, para medir su coste y no las
+esperas que impone Telegram; con --limites-reales usa los de config.py.
+
+Los updates sintéticos incluyen texto normal, palabras prohibidas, enlaces
+(bloqueados y no bloqueados), comandos, entradas al grupo y consultas inline.
+Los enlaces de Instagram no se generan porque su descarga sí usa la red.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_replay
+    python -m benchmarks.bench_replay --updates 20000
+    python -m benchmarks.bench_replay --fichero updates.jsonl  # un update JSON por línea
+    python -m benchmarks.bench_replay --limites-reales
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Optional
+
+# La base de datos se crea al importar los módulos del bot
+_DIRECTORIO = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_DIRECTORIO.name, "bench.db")
+
+from telegram import Update  # noqa: E402
+from telegram.request import HTTPXRequest, RequestData  # noqa: E402
+
+from config import ENVIOS_POR_MINUTO_GRUPO, ENVIOS_POR_SEGUNDO  # noqa: E402
+from envios import LimitadorEnvios  # noqa: E402
+from aplicacion import build_application  # noqa: E402
+from metricas import RequestInstrumentado  # noqa: E402
+from palabras import PALABRAS_BANEADAS  # noqa: E402
+from urls import DOMINIOS_BLOQUEADOS  # noqa: E402
+
+TOKEN = "123456:ABC"
+BOT_ID = 123456
+CHAT_ID = -1001234567890
+USUARIOS = 5000  # suficientes para no disparar el antiflood al reproducir deprisa
+SIN_LIMITE = 1e9
+MUESTRA = 1000
+
+rng = random.Random(1234)
+
+
+class _RespuestasSimuladas(HTTPXRequest):
+    """Responde a cada método de la Bot API sin salir a la red."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.llamadas: Counter[str] = Counter()
+        self._ids = itertools.count(1_000_000)
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        *args: Any,
+        **kwargs: Any,
+    ) -> tuple[int, bytes]:
+        metodo = url.rsplit("/", 1)[-1]
+        self.llamadas[metodo] += 1
+        parametros = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._resultado(metodo, parametros)}).encode()
+
+    def _mensaje(self, chat_id: Any) -> dict:
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "supergroup", "title": "Grupo"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bot", "username": "bench_bot"},
+            "text": "ok",
+        }
+
+    def _resultado(self, metodo: str, parametros: dict) -> Any:
+        if metodo == "getMe":
+            return {
+                "id": BOT_ID,
+                "is_bot": True,
+                "first_name": "Bot",
+                "username": "bench_bot",
+                "can_join_groups": True,
+                "can_read_all_group_messages": True,
+                "supports_inline_queries": True,
+            }
+        if metodo == "getChatAdministrators":
+            return [
+                {
+                    "status": "creator",
+                    "is_anonymous": False,
+                    "user": {"id": 1, "is_bot": False, "first_name": "Admin"},
+                }
+            ]
+        if metodo in ("sendMessage", "forwardMessage", "copyMessage", "sendPhoto", "sendVideo"):
+            return self._mensaje(parametros.get("chat_id", CHAT_ID))
+        if metodo == "sendMediaGroup":
+            return [self._mensaje(parametros.get("chat_id", CHAT_ID)) for _ in parametros["media"]]
+        if metodo == "forwardMessages":
+            return [{"message_id": next(self._ids)} for _ in parametros["message_ids"]]
+        return True
+
+
+class RequestSimulado(RequestInstrumentado, _RespuestasSimuladas):
+    """Request sin red que conserva la instrumentación de RequestInstrumentado."""
+
+
+# Updates sintéticos
+
+_contador_updates = itertools.count(1)
+_contador_mensajes = itertools.count(1)
+
+
+def _usuario(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"Usuario {user_id}", "username": f"u{user_id}"}
+
+
+def _chat() -> dict:
+    return {"id": CHAT_ID, "type": "supergroup", "title": "Grupo de pruebas"}
+
+
+def _mensaje(texto: str, entidades: Optional[list[dict]] = None, **extra: Any) -> dict:
+    mensaje = {
+        "message_id": next(_contador_mensajes),
+        "date": int(time.time()),
+        "chat": _chat(),
+        "from": _usuario(rng.randrange(1000, 1000 + USUARIOS)),
+        "text": texto,
+    }
+    if entidades:
+        mensaje["entities"] = entidades
+    mensaje.update(extra)
+    return {"update_id": next(_contador_updates), "message": mensaje}
+
+
+def _texto() -> dict:
+    palabras = rng.choices(["hola", "qué", "tal", "mañana", "vamos", "a", "la", "playa", "jaja"], k=rng.randint(3, 15))
+    return _mensaje(" ".join(palabras))
+
+
+def _palabra_prohibida() -> dict:
+    return _mensaje(f"oye {rng.choice(PALABRAS_BANEADAS)} mira esto")
+
+
+def _enlace(dominio: str) -> dict:
+    url = f"https://{dominio}/ruta/{rng.randrange(1000)}"
+    texto = f"mira {url} ya"
+    return _mensaje(texto, [{"type": "url", "offset": 5, "length": len(url)}])
+
+
+def _comando(comando: str) -> dict:
+    return _mensaje(comando, [{"type": "bot_command", "offset": 0, "length": len(comando)}])
+
+
+def _entrada() -> dict:
+    usuario = _usuario(rng.randrange(100_000, 200_000))
+    return {
+        "update_id": next(_contador_updates),
+        "chat_member": {
+            "chat": _chat(),
+            "from": usuario,
+            "date": int(time.time()),
+            "old_chat_member": {"status": "left", "user": usuario},
+            "new_chat_member": {"status": "member", "user": usuario},
+        },
+    }
+
+
+def _inline() -> dict:
+    return {
+        "update_id": next(_contador_updates),
+        "inline_query": {
+            "id": str(next(_contador_mensajes)),
+            "from": _usuario(rng.randrange(1000, 1000 + USUARIOS)),
+            "query": base64.b64encode(b"hola mundo").decode(),
+            "offset": "",
+        },
+    }
+
+
+# (peso, generador)
+_MEZCLA = [
+    (60, _texto),
+    (8, _palabra_prohibida),
+    (10, lambda: _enlace("example.com")),
+    (2, lambda: _enlace(rng.choice(DOMINIOS_BLOQUEADOS))),
+    (4, lambda: _comando("/start")),
+    (2, lambda: _comando("/rules")),
+    (2, lambda: _comando("/chatid")),
+    (8, _entrada),
+    (4, _inline),
+]
+
+
+def updates_sinteticos(n: int) -> list[dict]:
+    pesos = [peso for peso, _ in _MEZCLA]
+    generadores = [generador for _, generador in _MEZCLA]
+    return [rng.choices(generadores, pesos)[0]() for _ in range(n)]
+
+
+def updates_de_fichero(ruta: str) -> list[dict]:
+    with open(ruta, encoding="utf-8") as fichero:
+        return [json.loads(linea) for linea in fichero if linea.strip()]
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+async def procesar(application, update: Update) -> None:
+    """Pone el update en la cola y espera a que se termine de procesar."""
+    await application.update_queue.put(update)
+    await application.update_queue.join()
+
+
+async def reproducir(datos: list[dict], limites_reales: bool = False) -> None:
+    request = RequestSimulado()
+    if limites_reales:
+        limitador = LimitadorEnvios(ENVIOS_POR_SEGUNDO, ENVIOS_POR_MINUTO_GRUPO)
+    else:
+        limitador = LimitadorEnvios(SIN_LIMITE, SIN_LIMITE, SIN_LIMITE)
+    application = build_application(TOKEN, request=request, rate_limiter=limitador)
+    async with application:
+        await application.start()
+        updates = [Update.de_json(dato, application.bot) for dato in datos]
+        llamadas_inicio = sum(request.llamadas.values())
+
+        # Rendimiento: todos a la cola seguidos, como en una ráfaga
+        inicio = time.perf_counter()
+        for update in updates:
+            await application.update_queue.put(update)
+        await application.update_queue.join()
+        duracion = time.perf_counter() - inicio
+
+        # Latencia y asignaciones, de update en update para que no se mezclen
+        muestra = [Update.de_json(dato, application.bot) for dato in datos[:MUESTRA]]
+        latencias = []
+        bloques = []
+        for update in muestra:
+            base = sys.getallocatedblocks()
+            t = time.perf_counter()
+            await procesar(application, update)
+            latencias.append(time.perf_counter() - t)
+            bloques.append(sys.getallocatedblocks() - base)
+
+        # Memoria con tracemalloc en otra pasada: ralentiza mucho
+        muestra = [Update.de_json(dato, application.bot) for dato in datos[:MUESTRA]]
+        picos = []
+        tracemalloc.start()
+        antes = tracemalloc.take_snapshot()
+        for update in muestra:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            await procesar(application, update)
+            _, pico = tracemalloc.get_traced_memory()
+            picos.append(pico - base)
+        despues = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        retenidos = sum(estadistica.count_diff for estadistica in despues.compare_to(antes, "filename"))
+        await application.stop()
+
+    llamadas = sum(request.llamadas.values()) - llamadas_inicio
+    print(f"{len(updates)} updates en {duracion:.2f}s: {len(updates) / duracion:,.0f} updates/s")
+    print(
+        f"latencia por update ({len(muestra)} de uno en uno): p50 {1000 * percentil(latencias, 0.5):.3f} ms, "
+        f"p99 {1000 * percentil(latencias, 0.99):.3f} ms, "
+        f"media {1000 * statistics.fmean(latencias):.3f} ms"
+    )
+    print(
+        f"asignaciones por update: {statistics.fmean(bloques):,.1f} bloques netos "
+        f"(p99 {percentil(bloques, 0.99):,}), {retenidos / len(muestra):,.1f} bloques retenidos, "
+        f"pico medio {statistics.fmean(picos) / 1024:.1f} KiB"
+    )
+    print(f"llamadas a la API: {llamadas} ({llamadas / len(updates):.2f} por update)")
+    for metodo, veces in request.llamadas.most_common():
+        print(f"  {metodo:<24} {veces}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000, help="número de updates sintéticos")
+    parser.add_argument("--fichero", help="fichero JSONL con updates grabados")
+    parser.add_argument(
+        "--limites-reales", action="store_true", help="planificador de envíos con los límites de config.py"
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)  # los manejadores registran cada mensaje
+    datos = updates_de_fichero(args.fichero) if args.fichero else updates_sinteticos(args.updates)
+    asyncio.run(reproducir(datos, args.limites_reales))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark del detector de spam repetido (SimHash).
+
+Simula 100.000 mensajes de texto en 50 chats con tiempos sintéticos: la mayoría
+son conversación normal y el 2 % son campañas de spam, cada una con el mismo
+texto ligeramente cambiado (tildes, puntuación, números, palabras sueltas)
+enviado por usuarios distintos en chats distintos. Mide mensajes por segundo,
+memoria usada, mensajes de spam detectados y falsos positivos.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_simhash
+"""
+
+import random
+import time
+import tracemalloc
+
+from simhash import IndiceHuellas
+
+NUM_MENSAJES = 100_000
+MUESTRA_MEMORIA = 30_000
+CHATS = 50
+USUARIOS = 50_000
+CAMPANAS = 20
+PROPORCION_SPAM = 0.02
+VENTANA = 15 * 60.0
+
+rng = random.Random(1234)
+
+SILABAS = "ma ne ra lo ti ca sa de la pe ro mi to no bu con tra es en por".split()
+# Palabras inventadas; las primeras (las más cortas) se usan mucho más (ley de Zipf)
+VOCABULARIO = sorted(
+    {"".join(rng.choices(SILABAS, k=rng.randint(1, 4))) for _ in range(5000)}, key=lambda p: (len(p), p)
+)
+PESOS = [1 / (i + 1) for i in range(len(VOCABULARIO))]
+
+SPAM = [
+    "Gana {n}€ al día desde casa, escríbeme por privado y te explico cómo, plazas limitadas",
+    "Oferta exclusiva de criptomonedas con beneficios garantizados, únete al canal ahora",
+    "Vendo cuentas premium de netflix y spotify muy baratas, mandadme mensaje privado",
+    "Inversión segura con rentabilidad del {n}% mensual, contacta con mi asesor personal",
+    "Sorteo de un iphone nuevo para los primeros {n} que entren en el enlace de mi perfil",
+]
+
+
+def conversacion() -> str:
+    return " ".join(rng.choices(VOCABULARIO, PESOS, k=rng.randint(8, 25)))
+
+
+def variar(texto: str) -> str:
+    """Copia del texto con los cambios típicos entre mensajes de una campaña."""
+    palabras = texto.format(n=rng.randint(10, 999)).split()
+    for _ in range(rng.randint(0, 2)):
+        palabras.insert(rng.randrange(len(palabras)), rng.choice(["ya", "!!", "🔥", "👉", "hoy"]))
+    if rng.random() < 0.5:
+        palabras = [p.replace("á", "a").replace("é", "e").replace("í", "i").replace("ó", "o") for p in palabras]
+    if rng.random() < 0.3:
+        palabras = [p.upper() for p in palabras]
+    return " ".join(palabras)
+
+
+def generar_mensajes() -> list[tuple[int, int, str, bool]]:
+    campanas = [f"{rng.choice(SPAM)} {conversacion()}" for _ in range(CAMPANAS)]
+    mensajes = []
+    for _ in range(NUM_MENSAJES):
+        chat_id = -1000 - rng.randrange(CHATS)
+        user_id = rng.randrange(USUARIOS)
+        if rng.random() < PROPORCION_SPAM:
+            mensajes.append((chat_id, user_id, variar(rng.choice(campanas)), True))
+        else:
+            mensajes.append((chat_id, user_id, conversacion(), False))
+    return mensajes
+
+
+def main() -> None:
+    mensajes = generar_mensajes()
+    spam = sum(1 for *_, es_spam in mensajes if es_spam)
+    # Unos 200 mensajes por segundo en total
+    horas = [i * 0.005 for i in range(len(mensajes))]
+    print(f"{NUM_MENSAJES} mensajes ({spam} de spam en {CAMPANAS} campañas), ventana {VENTANA:g}s")
+    for max_grupos in [20_000, 5_000]:
+        indice = IndiceHuellas(max_usuarios=5, max_chats=3, ventana=VENTANA, max_grupos=max_grupos)
+        registrar = indice.registrar
+        detectados = falsos = 0
+        inicio = time.perf_counter()
+        for (chat_id, user_id, texto, es_spam), ahora in zip(mensajes, horas):
+            if registrar(chat_id, user_id, texto, ahora) is not None:
+                if es_spam:
+                    detectados += 1
+                else:
+                    falsos += 1
+        duracion = time.perf_counter() - inicio
+
+        # La memoria se mide aparte: tracemalloc ralentiza mucho el bucle
+        tracemalloc.start()
+        indice = IndiceHuellas(max_usuarios=5, max_chats=3, ventana=VENTANA, max_grupos=max_grupos)
+        for (chat_id, user_id, texto, _), ahora in zip(mensajes[:MUESTRA_MEMORIA], horas):
+            indice.registrar(chat_id, user_id, texto, ahora)
+        memoria, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"max_grupos {max_grupos:>6}: {NUM_MENSAJES / duracion:>8,.0f} msg/s, "
+            f"memoria {memoria / 2**20:6.1f} MiB ({len(indice)} grupos), "
+            f"spam detectado {detectados}/{spam}, {falsos} falsos positivos"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Benchmark de la clasificación de dominios.
+
+Compara el trie de sufijos de urls.py con la búsqueda en lista que hacía
+check_urls a medida que crece la lista de dominios bloqueados.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_urls
+"""
+
+import random
+import string
+import time
+
+from urls import ArbolDominios
+
+TAMANOS = [10, 1_000, 10_000, 100_000]
+NUM_BUSQUEDAS = 50_000
+
+rng = random.Random(1234)
+
+
+def dominio_aleatorio() -> str:
+    etiquetas = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(2)]
+    return ".".join(etiquetas) + rng.choice([".com", ".net", ".es", ".us"])
+
+
+def main() -> None:
+    print(f"{'dominios':>10} {'búsquedas/s trie':>18} {'búsquedas/s lista':>18}")
+    for tamano in TAMANOS:
+        bloqueados = [dominio_aleatorio() for _ in range(tamano)]
+        arbol = ArbolDominios(bloqueados)
+        # Mitad subdominios de dominios bloqueados, mitad dominios sin bloquear
+        hostnames = [
+            "www." + rng.choice(bloqueados) if rng.random() < 0.5 else dominio_aleatorio()
+            for _ in range(NUM_BUSQUEDAS)
+        ]
+
+        inicio = time.perf_counter()
+        for hostname in hostnames:
+            arbol.buscar(hostname)
+        velocidad_trie = NUM_BUSQUEDAS / (time.perf_counter() - inicio)
+
+        # La lista solo detecta coincidencias exactas, y aun así es O(n)
+        muestra = hostnames[: max(100, NUM_BUSQUEDAS * 10 // tamano)]
+        inicio = time.perf_counter()
+        for hostname in muestra:
+            hostname in bloqueados
+        velocidad_lista = len(muestra) / (time.perf_counter() - inicio)
+
+        print(f"{tamano:>10} {velocidad_trie:>18,.0f} {velocidad_lista:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
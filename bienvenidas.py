@@ -0,0 +1,97 @@
+import logging
+import time
+
+from telegram import User
+from telegram.constants import ParseMode
+from telegram.ext import ContextTypes
+
+from borrado import borrado_programado
+from config import BIENVENIDA_VENTANA, RAID_DURACION, RAID_UMBRAL
+from envios import BAJA
+from plantillas import BIENVENIDA, Markdown, escapar, mencion
+
+logger = logging.getLogger(__name__)
+
+# Menciones en cada bienvenida; el resto se cuentan
+MAX_MENCIONES = 10
+# Segundos que se mantiene cada bienvenida antes de borrarla
+DURACION_BIENVENIDA = 10 * 60
+
+
+class AgrupadorBienvenidas:
+    """Agrupa las entradas de cada chat en una sola bienvenida.
+
+    La primera entrada abre una ventana de ``ventana`` segundos; al cerrarse se
+    envía una bienvenida que menciona a todos los que han entrado. Si en una
+    ventana entran más de ``umbral_raid`` usuarios, el chat pasa a modo raid: no
+    se saluda a nadie (ni se hace ninguna llamada a la API) hasta que pasan
+    ``duracion_raid`` segundos sin entradas.
+    """
+
+    def __init__(self, ventana: float, umbral_raid: int, duracion_raid: float):
+        self.ventana = ventana
+        self.umbral_raid = umbral_raid
+        self.duracion_raid = duracion_raid
+        self._pendientes: dict[int, list[User]] = {}
+        self._raid_hasta: dict[int, float] = {}
+
+    def en_raid(self, chat_id: int) -> bool:
+        hasta = self._raid_hasta.get(chat_id)
+        if hasta is None:
+            return False
+        if hasta < time.monotonic():
+            del self._raid_hasta[chat_id]
+            logger.warning("Fin del modo raid en el chat %s", chat_id)
+            return False
+        return True
+
+    def registrar(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, user: User) -> None:
+        if self.en_raid(chat_id):
+            # Cada entrada alarga el modo raid; solo se actualiza un número
+            self._raid_hasta[chat_id] = time.monotonic() + self.duracion_raid
+            return
+
+        pendientes = self._pendientes.get(chat_id)
+        if pendientes is None:
+            pendientes = self._pendientes[chat_id] = []
+            if context.job_queue is None:
+                logger.error("No hay JobQueue: no se pueden enviar las bienvenidas")
+            else:
+                context.job_queue.run_once(
+                    self._enviar, self.ventana, chat_id=chat_id, name=f"bienvenida_{chat_id}"
+                )
+        pendientes.append(user)
+
+        if len(pendientes) > self.umbral_raid:
+            self._raid_hasta[chat_id] = time.monotonic() + self.duracion_raid
+            # La lista se vacía pero se queda en _pendientes hasta que venza el job
+            pendientes.clear()
+            logger.warning(
+                "Modo raid en el chat %s: más de %s entradas en %gs, se dejan de enviar bienvenidas",
+                chat_id, self.umbral_raid, self.ventana
+            )
+
+    async def _enviar(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if context.job is None or context.job.chat_id is None:
+            return
+        chat_id = context.job.chat_id
+        usuarios = self._pendientes.pop(chat_id, None)
+        if not usuarios or self.en_raid(chat_id):
+            return
+
+        menciones = ", ".join(mencion(user) for user in usuarios[:MAX_MENCIONES])
+        if len(usuarios) > MAX_MENCIONES:
+            menciones += escapar(f" y {len(usuarios) - MAX_MENCIONES} más")
+        texto = BIENVENIDA(plural="s" if len(usuarios) > 1 else "", miembros=Markdown(menciones))
+        try:
+            mensaje = await context.bot.send_message(
+                chat_id, texto, parse_mode=ParseMode.MARKDOWN_V2, rate_limit_args=BAJA
+            )
+        except Exception as e:
+            logger.error("No se pudo enviar la bienvenida al chat %s: %s", chat_id, e)
+            return
+        borrado_programado.programar(chat_id, mensaje.message_id, DURACION_BIENVENIDA)
+        logger.info("Bienvenida enviada a %s usuarios en el chat %s", len(usuarios), chat_id)
+
+
+agrupador_bienvenidas = AgrupadorBienvenidas(BIENVENIDA_VENTANA, RAID_UMBRAL, RAID_DURACION)
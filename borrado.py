@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from itertools import groupby
+from typing import Optional
+
+from telegram.ext import ContextTypes, JobQueue
+
+from admin import borrar_mensajes
+from config import BORRADO_INTERVALO, BORRADO_VENTANA, DB_PATH
+from envios import BAJA
+
+logger = logging.getLogger(__name__)
+
+# Mensajes que se sacan de la base de datos en cada tick, como mucho
+MAX_POR_TICK = 5000
+
+
+class BorradoProgramado:
+    """Borrado diferido de mensajes del bot que sobrevive a los reinicios.
+
+    Los mensajes pendientes se guardan en SQLite indexados por su hora de
+    vencimiento. Los que se programan se acumulan en memoria durante ``ventana``
+    segundos y se escriben juntos en una transacción (al parar, ``guardar``
+    escribe lo que quede), así que un reinicio brusco pierde como mucho los de
+    la última ventana. Cada ``intervalo`` segundos se leen los vencidos, se agrupan por chat y se borran
+    con deleteMessages, en lotes de hasta 100 ids. Las consultas a SQLite se
+    hacen fuera del event loop.
+    """
+
+    def __init__(self, ruta: str, intervalo: float, ventana: float = BORRADO_VENTANA):
+        self.intervalo = intervalo
+        self.ventana = ventana
+        # (worker, workers) en modo sharding: cada worker borra solo en sus chats
+        self._shard = (0, 1)
+        # (chat_id, message_id, vence) aún no escritos
+        self._pendientes: list[tuple[int, int, float]] = []
+        self._tarea_escritura: Optional[asyncio.Task] = None
+        self._lock_db = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS borrados ("
+            " chat_id INTEGER NOT NULL,"
+            " message_id INTEGER NOT NULL,"
+            " vence REAL NOT NULL,"
+            " PRIMARY KEY (chat_id, message_id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS borrados_vence ON borrados (vence)")
+
+    def __len__(self) -> int:
+        with self._lock_db:
+            return self._db.execute("SELECT COUNT(*) FROM borrados").fetchone()[0] + len(self._pendientes)
+
+    def programar(self, chat_id: int, message_id: int, retraso: float) -> None:
+        """Borra el mensaje dentro de ``retraso`` segundos."""
+        self._pendientes.append((chat_id, message_id, time.time() + retraso))
+        if self._tarea_escritura is None or self._tarea_escritura.done():
+            self._tarea_escritura = asyncio.create_task(self._guardar_tras_ventana())
+
+    async def guardar(self) -> None:
+        """Escribe los borrados programados que aún están en memoria."""
+        tarea = self._tarea_escritura
+        if tarea is not None and tarea is not asyncio.current_task():
+            # Lo que iba a escribir se escribe aquí
+            tarea.cancel()
+        pendientes, self._pendientes = self._pendientes, []
+        if not pendientes:
+            return
+        try:
+            await asyncio.to_thread(self._escribir, pendientes)
+        except sqlite3.Error:
+            # Vuelven a la cola; se reintentan en la próxima ventana o tick
+            self._pendientes[:0] = pendientes
+            logger.exception("Borrado programado: no se pudieron guardar %s mensajes", len(pendientes))
+
+    async def _guardar_tras_ventana(self) -> None:
+        await asyncio.sleep(self.ventana)
+        await self.guardar()
+
+    def configurar_shard(self, indice: int, total: int) -> None:
+        self._shard = (indice, total)
+
+    def iniciar(self, job_queue: JobQueue) -> None:
+        # El primer tick recoge también lo que venció con el bot parado
+        job_queue.run_repeating(self._tick, self.intervalo, first=1, name="borrado_programado")
+
+    async def _tick(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self.guardar()
+        vencidos = await asyncio.to_thread(self._vencidos, time.time())
+        if not vencidos:
+            return
+
+        for chat_id, filas in groupby(vencidos, key=lambda fila: fila[0]):
+            ids = [message_id for _, message_id in filas]
+            fallos = await borrar_mensajes(context.bot, chat_id, ids, rate_limit_args=BAJA)
+            if fallos:
+                logger.warning("Borrado programado: %s lotes fallidos en el chat %s", fallos, chat_id)
+        # También los fallidos: reintentarlos no suele servir (mensaje ya borrado,
+        # demasiado antiguo o el bot ya no está en el chat)
+        await asyncio.to_thread(self._quitar, vencidos)
+        logger.info("Borrado programado: %s mensajes vencidos", len(vencidos))
+
+    def _escribir(self, pendientes: list[tuple[int, int, float]]) -> None:
+        with self._lock_db, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO borrados (chat_id, message_id, vence) VALUES (?, ?, ?)",
+                pendientes,
+            )
+
+    def _vencidos(self, ahora: float) -> list[tuple[int, int]]:
+        indice, total = self._shard
+        # abs(chat_id) % total es sharding.shard_de
+        with self._lock_db:
+            return self._db.execute(
+                "SELECT chat_id, message_id FROM borrados WHERE vence <= ? AND abs(chat_id) % ? = ?"
+                " ORDER BY chat_id, message_id LIMIT ?",
+                (ahora, total, indice, MAX_POR_TICK),
+            ).fetchall()
+
+    def _quitar(self, vencidos: list[tuple[int, int]]) -> None:
+        with self._lock_db, self._db:
+            self._db.executemany(
+                "DELETE FROM borrados WHERE chat_id = ? AND message_id = ?", vencidos
+            )
+
+
+borrado_programado = BorradoProgramado(DB_PATH, BORRADO_INTERVALO)
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import DB_PATH, MEDIA_CACHE_MAX_EDAD, MEDIA_CACHE_MAX_ENTRADAS
+
+logger = logging.getLogger(__name__)
+
+# Tipos de medio guardados junto a cada file_id
+FOTO = "photo"
+VIDEO = "video"
+
+Medios = list[tuple[str, str]]  # [(tipo, file_id), ...]
+
+
+class CacheMedia:
+    """Caché persistente de los file_ids de Telegram por shortcode de Instagram.
+
+    Cuando un post ya se subió una vez, volver a enviarlo con sus file_ids no
+    requiere ni descargarlo ni subirlo de nuevo. Las entradas se guardan en
+    SQLite y se mantienen en memoria en orden LRU; se expulsan las menos usadas
+    por encima de ``max_entradas`` y las que superan ``max_edad`` segundos.
+
+    Un acierto solo toca la memoria: la hora de uso y las expulsiones se
+    escriben en SQLite juntas, fuera del event loop, con el siguiente ``put`` o
+    al llamar a ``guardar``.
+    """
+
+    def __init__(self, ruta: str, max_entradas: int, max_edad: float):
+        self.max_entradas = max_entradas
+        self.max_edad = max_edad
+        self.aciertos = 0
+        self.fallos = 0
+
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._lock_db = threading.Lock()
+        # Las escrituras se hacen en el orden en que se piden
+        self._lock_escritura = asyncio.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS media_cache ("
+            " shortcode TEXT PRIMARY KEY,"
+            " medios TEXT NOT NULL,"
+            " creado REAL NOT NULL,"
+            " usado REAL NOT NULL)"
+        )
+
+        # shortcode -> (creado, medios), de menos a más recientemente usado
+        self._entradas: OrderedDict[str, tuple[float, Medios]] = OrderedDict()
+        # Cambios aún no escritos: shortcode -> hora de uso, y shortcodes expulsados
+        self._usados: dict[str, float] = {}
+        self._borrados: set[str] = set()
+        for shortcode, medios, creado in self._db.execute(
+            "SELECT shortcode, medios, creado FROM media_cache ORDER BY usado"
+        ):
+            self._entradas[shortcode] = (creado, [tuple(m) for m in json.loads(medios)])
+        # Las caducadas se comprueban al leerlas; al arrancar se limpia todo
+        self._expulsar_caducadas()
+        self._expulsar()
+        self._escribir(None, {}, self._borrados)
+        self._borrados = set()
+        logger.info("Caché de medios cargada con %s posts", len(self._entradas))
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    @property
+    def tasa_aciertos(self) -> float:
+        total = self.aciertos + self.fallos
+        return self.aciertos / total if total else 0.0
+
+    async def get(self, shortcode: str) -> Optional[Medios]:
+        """Devuelve los file_ids guardados para el post, o None si no están en caché."""
+        entrada = self._entradas.get(shortcode)
+        if entrada is None and shortcode not in self._borrados:
+            # Puede haberlo guardado otro proceso (modo sharding)
+            entrada = await asyncio.to_thread(self._leer, shortcode)
+            if entrada is not None:
+                self._entradas[shortcode] = entrada
+                self._expulsar()
+        if entrada is not None and time.time() - entrada[0] > self.max_edad:
+            self._borrar(shortcode)
+            entrada = None
+        if entrada is None:
+            self.fallos += 1
+            return None
+
+        self.aciertos += 1
+        if shortcode in self._entradas:
+            self._entradas.move_to_end(shortcode)
+            self._usados[shortcode] = time.time()
+        return entrada[1]
+
+    async def put(self, shortcode: str, medios: Medios) -> None:
+        """Guarda los file_ids devueltos por Telegram al enviar el post."""
+        if not medios:
+            return
+        ahora = time.time()
+        self._entradas[shortcode] = (ahora, medios)
+        self._entradas.move_to_end(shortcode)
+        self._usados.pop(shortcode, None)
+        self._borrados.discard(shortcode)
+        self._expulsar()
+        nueva = (shortcode, json.dumps(medios), ahora) if shortcode in self._entradas else None
+        await self._volcar(nueva)
+
+    async def guardar(self) -> None:
+        """Escribe las horas de uso y las expulsiones pendientes."""
+        await self._volcar(None)
+
+    async def _volcar(self, nueva: Optional[tuple[str, str, float]]) -> None:
+        usados, self._usados = self._usados, {}
+        borrados, self._borrados = self._borrados, set()
+        if nueva is None and not usados and not borrados:
+            return
+        try:
+            async with self._lock_escritura:
+                await asyncio.to_thread(self._escribir, nueva, usados, borrados)
+        except sqlite3.Error:
+            logger.exception("No se pudo guardar la caché de medios")
+
+    def _escribir(
+        self, nueva: Optional[tuple[str, str, float]], usados: dict[str, float], borrados: set[str]
+    ) -> None:
+        with self._lock_db:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "DELETE FROM media_cache WHERE shortcode = ?", [(s,) for s in borrados]
+                )
+                if nueva is not None:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO media_cache (shortcode, medios, creado, usado)"
+                        " VALUES (?, ?, ?, ?)",
+                        (*nueva, nueva[2]),
+                    )
+                self._db.executemany(
+                    "UPDATE media_cache SET usado = ? WHERE shortcode = ?",
+                    [(usado, s) for s, usado in usados.items()],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _leer(self, shortcode: str) -> Optional[tuple[float, Medios]]:
+        with self._lock_db:
+            fila = self._db.execute(
+                "SELECT medios, creado FROM media_cache WHERE shortcode = ?", (shortcode,)
+            ).fetchone()
+        if fila is None:
+            return None
+        return (fila[1], [tuple(m) for m in json.loads(fila[0])])
+
+    def _borrar(self, shortcode: str) -> None:
+        self._entradas.pop(shortcode, None)
+        self._usados.pop(shortcode, None)
+        self._borrados.add(shortcode)
+
+    def _expulsar(self) -> None:
+        """Expulsa las entradas menos usadas por encima del máximo."""
+        while len(self._entradas) > self.max_entradas:
+            self._borrar(next(iter(self._entradas)))
+
+    def _expulsar_caducadas(self) -> None:
+        limite = time.time() - self.max_edad
+        for shortcode in [s for s, (creado, _) in self._entradas.items() if creado < limite]:
+            self._borrar(shortcode)
+
+    def estadisticas(self) -> dict[str, float]:
+        return {
+            "entradas": len(self._entradas),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.tasa_aciertos,
+        }
+
+
+cache_media = CacheMedia(DB_PATH, MEDIA_CACHE_MAX_ENTRADAS, MEDIA_CACHE_MAX_EDAD)
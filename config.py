@@ -0,0 +1,126 @@
+# Configuración del bot a partir de variables de entorno (o del fichero .env)
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _entero(nombre: str, defecto: int) -> int:
+    valor = os.environ.get(nombre)
+    return int(valor) if valor else defecto
+
+
+def _decimal(nombre: str, defecto: float) -> float:
+    valor = os.environ.get(nombre)
+    return float(valor) if valor else defecto
+
+
+# Descargas de Instagram
+INSTAGRAM_WORKERS = _entero("INSTAGRAM_WORKERS", 2)  # descargas simultáneas
+INSTAGRAM_MAX_PENDIENTES = _entero("INSTAGRAM_MAX_PENDIENTES", 10)  # descargas en espera
+INSTAGRAM_TIMEOUT = _decimal("INSTAGRAM_TIMEOUT", 60)  # segundos por descarga
+
+# Sesiones de Instagram a cargar con load_session_from_file: "usuario[:fichero],..."
+INSTAGRAM_SESIONES = os.environ.get("INSTAGRAM_SESIONES", "")
+INSTAGRAM_ENFRIAMIENTO = _decimal("INSTAGRAM_ENFRIAMIENTO", 600)  # segundos tras un 429
+
+# Base de datos local (caché de medios, etc.)
+DB_PATH = os.environ.get("DB_PATH", "bot.db")
+
+# Caché de file_ids de Telegram por shortcode de Instagram
+MEDIA_CACHE_MAX_ENTRADAS = _entero("MEDIA_CACHE_MAX_ENTRADAS", 5000)
+MEDIA_CACHE_MAX_EDAD = _decimal("MEDIA_CACHE_MAX_EDAD", 30 * 24 * 60 * 60)  # segundos
+
+# Recepción de updates: "polling" o "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling").lower()
+# URL pública del webhook; si no se indica, el webhook no se registra en Telegram
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN", "")
+# Sin WEBHOOK_URL ni WEBHOOK_SECRET_TOKEN el webhook aceptaría updates de
+# cualquiera; solo se permite con esta opción, pensada para pruebas en local
+WEBHOOK_SIN_SECRETO = bool(_entero("WEBHOOK_SIN_SECRETO", 0))
+
+# Servidor HTTP (health check y webhook)
+HTTP_HOST = os.environ.get("HTTP_HOST", "")
+HTTP_PORT = _entero("HTTP_PORT", 8080)
+
+# Manejadores más lentos que este umbral se registran en el log
+SLOW_HANDLER_MS = _decimal("SLOW_HANDLER_MS", 500)
+
+# Segundos que se guardan en caché los administradores de cada chat
+ADMINS_TTL = _decimal("ADMINS_TTL", 300)
+# Chats cuyos admins se recuerdan (también caducados, por si falla la API)
+ADMINS_MAX_CHATS = _entero("ADMINS_MAX_CHATS", 10_000)
+
+# Límites de envío a la Bot API
+ENVIOS_POR_SEGUNDO = _decimal("ENVIOS_POR_SEGUNDO", 30)  # en total
+ENVIOS_POR_MINUTO_GRUPO = _decimal("ENVIOS_POR_MINUTO_GRUPO", 20)  # a cada grupo
+
+# Resúmenes de alertas de palabras prohibidas
+ALERTAS_VENTANA = _decimal("ALERTAS_VENTANA", 60)  # segundos que se acumulan
+ALERTAS_MAX_REENVIOS = _entero("ALERTAS_MAX_REENVIOS", 5)  # originales reenviados por resumen
+
+# Cada cuántos segundos se borran los mensajes del bot programados para borrarse
+BORRADO_INTERVALO = _decimal("BORRADO_INTERVALO", 15)
+# Segundos que se agrupan los borrados programados antes de escribirlos en SQLite;
+# es lo que se puede perder si el proceso muere sin pararse
+BORRADO_VENTANA = _decimal("BORRADO_VENTANA", 1)
+
+# Antiflood: más de FLOOD_MENSAJES mensajes en FLOOD_VENTANA segundos silencia al usuario
+FLOOD_MENSAJES = _entero("FLOOD_MENSAJES", 8)
+FLOOD_VENTANA = _decimal("FLOOD_VENTANA", 10)
+FLOOD_SILENCIO = _decimal("FLOOD_SILENCIO", 5 * 60)  # segundos que dura la restricción
+FLOOD_MAX_USUARIOS = _entero("FLOOD_MAX_USUARIOS", 100_000)  # usuarios vigilados a la vez
+
+# Bienvenidas: las entradas se agrupan durante BIENVENIDA_VENTANA segundos
+BIENVENIDA_VENTANA = _decimal("BIENVENIDA_VENTANA", 10)
+# Más de RAID_UMBRAL entradas en una ventana activan el modo raid (sin bienvenidas)
+RAID_UMBRAL = _entero("RAID_UMBRAL", 20)
+RAID_DURACION = _decimal("RAID_DURACION", 5 * 60)  # segundos sin entradas para salir
+
+# Historial de mensajes recientes (para /purge y contexto de moderación)
+HISTORIAL_MAX_MENSAJES = _entero("HISTORIAL_MAX_MENSAJES", 500_000)  # en total, unos 40 bytes cada uno
+# Chats con historial a la vez: cuando hay más, el chat inactivo desde hace más
+# tiempo pierde el suyo (y /purge deja de encontrar sus mensajes)
+HISTORIAL_CHATS = _entero("HISTORIAL_CHATS", 2000)
+# Últimos mensajes de cada chat; por defecto se reparte el total entre HISTORIAL_CHATS
+HISTORIAL_POR_CHAT = _entero("HISTORIAL_POR_CHAT", max(1, HISTORIAL_MAX_MENSAJES // max(1, HISTORIAL_CHATS)))
+
+# Spam repetido: el mismo texto (con pequeños cambios) enviado por SPAM_USUARIOS
+# usuarios distintos o en SPAM_CHATS chats distintos en SPAM_VENTANA segundos
+SPAM_USUARIOS = _entero("SPAM_USUARIOS", 5)
+SPAM_CHATS = _entero("SPAM_CHATS", 3)
+SPAM_VENTANA = _decimal("SPAM_VENTANA", 15 * 60)
+SPAM_DISTANCIA = _entero("SPAM_DISTANCIA", 6)  # bits distintos entre huellas SimHash
+SPAM_MAX_HUELLAS = _entero("SPAM_MAX_HUELLAS", 20_000)  # textos distintos recordados
+SPAM_MIN_CARACTERES = _entero("SPAM_MIN_CARACTERES", 40)  # los textos más cortos no se miran
+# Se avisa a los admins; con SPAM_BORRAR=1 además se borran los enviados en SPAM_CHATS chats
+SPAM_BORRAR = bool(_entero("SPAM_BORRAR", 0))
+
+# Resolución de enlaces acortados (bit.ly, t.ly...)
+REDIRECCIONES_SALTOS = _entero("REDIRECCIONES_SALTOS", 5)  # redirecciones seguidas como mucho
+REDIRECCIONES_TIMEOUT = _decimal("REDIRECCIONES_TIMEOUT", 3)  # segundos por petición
+# Segundos que un mensaje espera como mucho a que se resuelvan sus enlaces
+REDIRECCIONES_PRESUPUESTO = _decimal("REDIRECCIONES_PRESUPUESTO", 4)
+REDIRECCIONES_TTL = _decimal("REDIRECCIONES_TTL", 60 * 60)  # segundos en caché
+REDIRECCIONES_MAX_ENTRADAS = _entero("REDIRECCIONES_MAX_ENTRADAS", 10_000)
+REDIRECCIONES_CONEXIONES = _entero("REDIRECCIONES_CONEXIONES", 20)  # conexiones HTTP abiertas
+
+# Modo sharding: con SHARDS > 1, un proceso recibe los updates y los reparte por
+# chat entre SHARDS procesos workers
+SHARDS = _entero("SHARDS", 1)
+SHARD_MAX_PENDIENTES = _entero("SHARD_MAX_PENDIENTES", 1000)  # updates en la cola de cada worker
+
+# Procesamiento de updates: en paralelo entre chats, en orden dentro de cada chat
+UPDATES_CONCURRENTES = _entero("UPDATES_CONCURRENTES", 32)  # manejadores ejecutándose a la vez
+UPDATES_PENDIENTES = _entero("UPDATES_PENDIENTES", 1000)  # admitidos (en curso o esperando turno)
+
+# Logging: "json" (una línea por registro) o "texto"
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO")
+LOG_FORMATO = os.environ.get("LOG_FORMATO", "json").lower()
+# Los registros de cada mensaje se muestrean: se guarda esta fracción...
+LOG_MUESTRA = _decimal("LOG_MUESTRA", 0.1)
+# ...y como mucho estos por segundo
+LOG_MAX_POR_SEGUNDO = _decimal("LOG_MAX_POR_SEGUNDO", 20)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from config import INSTAGRAM_MAX_PENDIENTES, INSTAGRAM_TIMEOUT, INSTAGRAM_WORKERS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ColaLlena(Exception):
+    """Se lanza cuando el pool no admite más trabajos en espera."""
+
+
+class PoolDescargas:
+    """Ejecuta código bloqueante (red y disco) fuera del event loop.
+
+    Los trabajos corren en un ThreadPoolExecutor propio con un máximo de
+    ``max_workers`` hilos. Como mucho ``max_pendientes`` trabajos más pueden
+    quedar esperando un hilo libre; por encima de eso se rechazan con
+    ColaLlena en vez de acumularse sin límite. Cada trabajo tiene un timeout:
+    al vencer se deja de esperar su resultado (un hilo que ya empezó no se
+    puede interrumpir, pero su hueco se libera en cuanto termina).
+    """
+
+    def __init__(self, max_workers: int, max_pendientes: int, timeout: float):
+        self.max_workers = max_workers
+        self.max_pendientes = max_pendientes
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="descargas"
+        )
+        self._lock = threading.Lock()
+        self._trabajos = 0  # en ejecución + en espera
+
+    @property
+    def trabajos(self) -> int:
+        """Número de trabajos en ejecución o en espera."""
+        return self._trabajos
+
+    def _liberar(self, _futuro: Future) -> None:
+        with self._lock:
+            self._trabajos -= 1
+
+    async def ejecutar(self, funcion: Callable[..., T], *args: Any) -> T:
+        """Ejecuta ``funcion(*args)`` en el pool y espera su resultado.
+
+        Raises:
+            ColaLlena: si ya hay ``max_workers + max_pendientes`` trabajos.
+            asyncio.TimeoutError: si el trabajo no termina dentro del timeout.
+        """
+        with self._lock:
+            if self._trabajos >= self.max_workers + self.max_pendientes:
+                raise ColaLlena()
+            self._trabajos += 1
+
+        futuro = self._executor.submit(funcion, *args)
+        futuro.add_done_callback(self._liberar)
+        # Si vence el timeout antes de que el trabajo empiece, wait_for
+        # cancela el futuro y el trabajo ya no llega a ejecutarse.
+        return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+pool_descargas = PoolDescargas(
+    max_workers=INSTAGRAM_WORKERS,
+    max_pendientes=INSTAGRAM_MAX_PENDIENTES,
+    timeout=INSTAGRAM_TIMEOUT,
+)
@@ -0,0 +1,267 @@
+import asyncio
+import datetime
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Coroutine, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import ENVIOS_POR_MINUTO_GRUPO, ENVIOS_POR_SEGUNDO
+
+logger = logging.getLogger(__name__)
+
+# Carriles de prioridad, de más a menos urgente. Se pueden indicar en cada
+# llamada con rate_limit_args, p. ej. bot.send_message(..., rate_limit_args=BAJA)
+ALTA = 0  # moderación: baneos, borrados, restricciones
+NORMAL = 1  # respuestas, alertas y reenvíos
+BAJA = 2  # saludos y mensajes automáticos
+CARRILES = ("alta", "normal", "baja")
+
+_MODERACION = frozenset(
+    [
+        "banChatMember",
+        "unbanChatMember",
+        "restrictChatMember",
+        "deleteMessage",
+        "deleteMessages",
+        "banChatSenderChat",
+        "declineChatJoinRequest",
+    ]
+)
+# Métodos sujetos al límite de mensajes por chat
+_PREFIJOS_MENSAJE = ("send", "forward", "copy")
+
+MAX_REINTENTOS = 3
+# Los buckets por chat llenos se descartan cuando hay más de estos
+MAX_CUBETAS = 10_000
+
+
+class _Cubeta:
+    """Token bucket: ``tasa`` fichas por segundo hasta un máximo de ``capacidad``."""
+
+    __slots__ = ("tasa", "capacidad", "fichas", "ultimo", "pausa_hasta")
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.fichas = capacidad
+        self.ultimo = time.monotonic()
+        self.pausa_hasta = 0.0
+
+    def espera(self, ahora: float) -> float:
+        """Segundos hasta que haya una ficha (0 si ya la hay)."""
+        if self.pausa_hasta > ahora:
+            return self.pausa_hasta - ahora
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+        if self.fichas >= 1:
+            return 0.0
+        return (1 - self.fichas) / self.tasa
+
+    def consumir(self) -> None:
+        self.fichas -= 1
+
+    def llena(self, ahora: float) -> bool:
+        return self.espera(ahora) == 0 and self.fichas >= self.capacidad
+
+    def pausar(self, segundos: float) -> None:
+        self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + segundos)
+
+
+class LimitadorEnvios(BaseRateLimiter[int]):
+    """Planificador central de todas las llamadas del bot a la Bot API.
+
+    Cada llamada espera su turno en un carril de prioridad; un único despachador
+    da paso a la más prioritaria cuyo chat tenga fichas, respetando además un
+    límite global de llamadas por segundo. Dentro de un carril los chats se
+    atienden por turnos, para que un chat saturado no retrase a los demás. Los
+    límites por chat solo se aplican a los métodos que envían mensajes.
+
+    Ante un RetryAfter se pausa el chat (o todo el bot, si la llamada no era a un
+    chat) durante el tiempo indicado y la llamada se vuelve a encolar.
+
+    Args:
+        por_segundo: llamadas por segundo en total.
+        por_minuto_grupo: mensajes por minuto a cada grupo o canal.
+        por_segundo_privado: mensajes por segundo a cada chat privado.
+        max_reintentos: reintentos tras un RetryAfter antes de propagarlo.
+    """
+
+    def __init__(
+        self,
+        por_segundo: float = 30,
+        por_minuto_grupo: float = 20,
+        por_segundo_privado: float = 1,
+        max_reintentos: int = MAX_REINTENTOS,
+    ):
+        self.por_segundo = por_segundo
+        self.por_minuto_grupo = por_minuto_grupo
+        self.por_segundo_privado = por_segundo_privado
+        self.max_reintentos = max_reintentos
+        self._global = _Cubeta(por_segundo, por_segundo)
+        self._cubetas: dict[Union[int, str], _Cubeta] = {}
+        # Un carril por prioridad: chat -> cola de futuros esperando turno
+        self._carriles: list[OrderedDict[Union[int, str, None], deque[asyncio.Future]]] = [
+            OrderedDict() for _ in CARRILES
+        ]
+        self._pendientes = [0] * len(CARRILES)
+        self._hay_trabajo: Optional[asyncio.Event] = None
+        self._despachador: Optional[asyncio.Task] = None
+
+    async def initialize(self) -> None:
+        # PTB puede inicializarlo más de una vez (el bot y la aplicación)
+        if self._despachador is not None:
+            return
+        self._hay_trabajo = asyncio.Event()
+        self._despachador = asyncio.create_task(self._despachar())
+
+    async def shutdown(self) -> None:
+        if self._despachador is not None:
+            self._despachador.cancel()
+            try:
+                await self._despachador
+            except asyncio.CancelledError:
+                pass
+            self._despachador = None
+        for carril in self._carriles:
+            for cola in carril.values():
+                for futuro in cola:
+                    futuro.cancel()
+            carril.clear()
+        self._pendientes = [0] * len(CARRILES)
+
+    def pendientes(self, carril: Optional[int] = None) -> int:
+        """Llamadas esperando turno, en total o en un carril."""
+        if carril is None:
+            return sum(self._pendientes)
+        return self._pendientes[carril]
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, dict, list[dict]]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, dict, list[dict]]:
+        # Las consultas (getUpdates, getMe, getChatAdministrators...) no se limitan
+        if endpoint.startswith("get") or self._despachador is None:
+            return await callback(*args, **kwargs)
+
+        if rate_limit_args is not None:
+            carril = rate_limit_args
+        else:
+            carril = ALTA if endpoint in _MODERACION else NORMAL
+        chat_id = data.get("chat_id") if endpoint.startswith(_PREFIJOS_MENSAJE) else None
+
+        intento = 0
+        while True:
+            await self._turno(carril, chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if intento == self.max_reintentos:
+                    raise
+                intento += 1
+                espera = e.retry_after
+                if isinstance(espera, datetime.timedelta):
+                    espera = espera.total_seconds()
+                cubeta = self._cubeta(chat_id) if chat_id is not None else self._global
+                cubeta.pausar(espera + 0.1)
+                logger.warning(
+                    "RetryAfter de %ss en %s (chat %s), reintento %s",
+                    espera, endpoint, chat_id, intento
+                )
+
+    def _cubeta(self, chat_id: Union[int, str]) -> _Cubeta:
+        cubeta = self._cubetas.get(chat_id)
+        if cubeta is None:
+            if isinstance(chat_id, str) or chat_id < 0:
+                # Grupos y canales: pequeñas ráfagas, ``por_minuto_grupo`` de media
+                cubeta = _Cubeta(self.por_minuto_grupo / 60, 3)
+            else:
+                cubeta = _Cubeta(self.por_segundo_privado, 1)
+            self._cubetas[chat_id] = cubeta
+        return cubeta
+
+    async def _turno(self, carril: int, chat_id: Union[int, str, None]) -> None:
+        futuro = asyncio.get_running_loop().create_future()
+        self._carriles[carril].setdefault(chat_id, deque()).append(futuro)
+        self._pendientes[carril] += 1
+        self._hay_trabajo.set()
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            # Si el despachador ya lo había sacado de la cola, no hay nada que quitar
+            self._descartar(carril, chat_id, futuro)
+            raise
+
+    def _descartar(self, carril: int, chat_id: Union[int, str, None], futuro: asyncio.Future) -> None:
+        cola = self._carriles[carril].get(chat_id)
+        if cola is not None and futuro in cola:
+            cola.remove(futuro)
+            self._pendientes[carril] -= 1
+            if not cola:
+                del self._carriles[carril][chat_id]
+
+    def _elegir(self, ahora: float) -> tuple[Optional[asyncio.Future], float]:
+        """Devuelve el siguiente futuro al que dar paso, o cuánto esperar."""
+        minima = float("inf")
+        for carril, chats in enumerate(self._carriles):
+            for chat_id, cola in chats.items():
+                espera = self._cubeta(chat_id).espera(ahora) if chat_id is not None else 0.0
+                if espera > 0:
+                    minima = min(minima, espera)
+                    continue
+                futuro = cola.popleft()
+                self._pendientes[carril] -= 1
+                if cola:
+                    chats.move_to_end(chat_id)  # turno rotatorio entre chats
+                else:
+                    del chats[chat_id]
+                if chat_id is not None:
+                    self._cubeta(chat_id).consumir()
+                return futuro, 0.0
+        return None, minima
+
+    async def _despachar(self) -> None:
+        while True:
+            if not self.pendientes():
+                self._hay_trabajo.clear()
+                await self._hay_trabajo.wait()
+                continue
+
+            ahora = time.monotonic()
+            espera = self._global.espera(ahora)
+            if espera > 0:
+                await asyncio.sleep(espera)
+                continue
+
+            futuro, espera = self._elegir(ahora)
+            if futuro is None:
+                # Todos los chats con trabajo están limitados; una llamada nueva
+                # de otro chat o de más prioridad puede pasar antes
+                self._hay_trabajo.clear()
+                try:
+                    await asyncio.wait_for(self._hay_trabajo.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if not futuro.done():
+                self._global.consumir()
+                futuro.set_result(None)
+            if len(self._cubetas) > MAX_CUBETAS:
+                self._limpiar(ahora)
+
+    def _limpiar(self, ahora: float) -> None:
+        # Una cubeta llena equivale a una nueva, así que se puede descartar
+        en_uso = {chat_id for chats in self._carriles for chat_id in chats}
+        for chat_id in [c for c, cubeta in self._cubetas.items() if c not in en_uso and cubeta.llena(ahora)]:
+            del self._cubetas[chat_id]
+
+
+limitador_envios = LimitadorEnvios(ENVIOS_POR_SEGUNDO, ENVIOS_POR_MINUTO_GRUPO)
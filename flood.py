@@ -0,0 +1,75 @@
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from config import FLOOD_MAX_USUARIOS, FLOOD_MENSAJES, FLOOD_VENTANA
+
+
+class DetectorFlood:
+    """Detecta usuarios que envían más de ``max_mensajes`` en ``ventana`` segundos.
+
+    Cada par (chat, usuario) tiene un buffer circular con las horas de sus
+    últimos ``max_mensajes`` mensajes: si el mensaje más antiguo del buffer es de
+    hace menos de ``ventana`` segundos, el usuario ha superado el límite. Los
+    buffers son huecos de un único array preasignado para ``max_usuarios``
+    usuarios, así que la memoria está acotada; cuando se llena, se reutiliza el
+    hueco del usuario inactivo desde hace más tiempo. Todo es O(1) por mensaje.
+    """
+
+    def __init__(self, max_mensajes: int, ventana: float, max_usuarios: int):
+        if not 1 <= max_mensajes <= 255:
+            raise ValueError("max_mensajes debe estar entre 1 y 255")
+        self.max_mensajes = max_mensajes
+        self.ventana = ventana
+        self.max_usuarios = max_usuarios
+        self._horas = array("d", bytes(8 * max_mensajes * max_usuarios))
+        self._posiciones = array("B", bytes(max_usuarios))  # siguiente posición de cada buffer
+        # (chat, usuario) -> hueco, de menos a más recientemente activo
+        self._huecos: OrderedDict[tuple[int, int], int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._huecos)
+
+    def registrar(self, chat_id: int, user_id: int, ahora: Optional[float] = None) -> bool:
+        """Registra un mensaje y devuelve True si el usuario supera el límite."""
+        if ahora is None:
+            ahora = time.monotonic()
+        clave = (chat_id, user_id)
+        hueco = self._huecos.get(clave)
+        if hueco is None:
+            hueco = self._asignar(clave)
+        else:
+            self._huecos.move_to_end(clave)
+
+        posicion = self._posiciones[hueco]
+        indice = hueco * self.max_mensajes + posicion
+        # La posición siguiente guarda el mensaje de hace max_mensajes mensajes
+        mas_antiguo = self._horas[indice]
+        self._horas[indice] = ahora
+        self._posiciones[hueco] = (posicion + 1) % self.max_mensajes
+        return mas_antiguo > 0 and ahora - mas_antiguo < self.ventana
+
+    def reiniciar(self, chat_id: int, user_id: int) -> None:
+        """Olvida los mensajes del usuario, p. ej. tras silenciarlo."""
+        hueco = self._huecos.get((chat_id, user_id))
+        if hueco is not None:
+            self._limpiar(hueco)
+
+    def _asignar(self, clave: tuple[int, int]) -> int:
+        if len(self._huecos) < self.max_usuarios:
+            hueco = len(self._huecos)
+        else:
+            _, hueco = self._huecos.popitem(last=False)
+            self._limpiar(hueco)
+        self._huecos[clave] = hueco
+        return hueco
+
+    def _limpiar(self, hueco: int) -> None:
+        inicio = hueco * self.max_mensajes
+        for i in range(inicio, inicio + self.max_mensajes):
+            self._horas[i] = 0.0
+        self._posiciones[hueco] = 0
+
+
+detector_flood = DetectorFlood(FLOOD_MENSAJES, FLOOD_VENTANA, FLOOD_MAX_USUARIOS)
@@ -0,0 +1,161 @@
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from config import HISTORIAL_MAX_MENSAJES, HISTORIAL_POR_CHAT
+
+
+class MensajeReciente:
+    """Metadatos de un mensaje del historial."""
+
+    __slots__ = ("message_id", "user_id", "hora", "hash")
+
+    def __init__(self, message_id: int, user_id: int, hora: float, hash: int):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.hora = hora
+        self.hash = hash
+
+    def __repr__(self) -> str:
+        return f"MensajeReciente({self.message_id}, user_id={self.user_id}, hora={self.hora:.0f})"
+
+
+def hash_contenido(texto: Optional[str]) -> int:
+    """Hash de 64 bits del texto (0 si no hay texto); solo vale dentro del proceso."""
+    return hash(texto) if texto else 0
+
+
+class HistorialMensajes:
+    """Buffer circular con los últimos mensajes de cada chat.
+
+    La Bot API no permite listar los mensajes de un chat ni de un usuario, así
+    que para purgarlos hay que haberlos visto pasar. De cada mensaje se guarda
+    el id, el autor, la hora y un hash del contenido en arrays preasignados para
+    ``max_mensajes`` mensajes en total, repartidos en huecos de ``por_chat``
+    mensajes por chat: la memoria no pasa de ``max_mensajes`` entradas (unos 40
+    bytes cada una). Caben ``max_mensajes // por_chat`` chats a la vez (con la
+    configuración por defecto, HISTORIAL_CHATS); cuando no quedan huecos se
+    reutiliza el del chat inactivo desde hace más tiempo.
+
+    Cada entrada apunta a la anterior del mismo usuario en el mismo chat, y cada
+    chat guarda la última de cada usuario, así que registrar un mensaje es O(1)
+    y ``ultimos`` solo recorre los mensajes del usuario.
+    """
+
+    def __init__(self, max_mensajes: int = HISTORIAL_MAX_MENSAJES, por_chat: int = HISTORIAL_POR_CHAT):
+        if not 0 < por_chat <= max_mensajes:
+            raise ValueError("por_chat debe estar entre 1 y max_mensajes")
+        self.por_chat = por_chat
+        self.max_chats = max_mensajes // por_chat
+        total = self.max_chats * por_chat
+        self._ids = array("q", bytes(8 * total))  # 0: mensaje olvidado
+        self._usuarios = array("q", bytes(8 * total))
+        self._horas = array("d", bytes(8 * total))
+        self._hashes = array("q", bytes(8 * total))
+        # Número de secuencia (dentro del chat) del mensaje anterior del mismo usuario; -1 si no hay
+        self._anteriores = array("q", bytes(8 * total))
+        # Mensajes registrados en cada hueco desde que se asignó al chat
+        self._secuencias = array("q", bytes(8 * self.max_chats))
+        # chat -> hueco, de menos a más recientemente activo
+        self._huecos: OrderedDict[int, int] = OrderedDict()
+        # Por hueco: usuario -> número de secuencia de su último mensaje
+        self._ultimo_por_usuario: list[dict[int, int]] = [{} for _ in range(self.max_chats)]
+
+    def __len__(self) -> int:
+        return len(self._huecos)
+
+    def registrar(
+        self,
+        chat_id: int,
+        user_id: int,
+        message_id: int,
+        texto: Optional[str] = None,
+        hora: Optional[float] = None,
+    ) -> None:
+        hueco = self._huecos.get(chat_id)
+        if hueco is None:
+            hueco = self._asignar(chat_id)
+        else:
+            self._huecos.move_to_end(chat_id)
+
+        secuencia = self._secuencias[hueco]
+        self._secuencias[hueco] = secuencia + 1
+        i = hueco * self.por_chat + secuencia % self.por_chat
+        self._ids[i] = message_id
+        self._usuarios[i] = user_id
+        self._horas[i] = time.time() if hora is None else hora
+        self._hashes[i] = hash_contenido(texto)
+
+        ultimos = self._ultimo_por_usuario[hueco]
+        self._anteriores[i] = ultimos.get(user_id, -1)
+        ultimos[user_id] = secuencia
+        if len(ultimos) > 2 * self.por_chat:
+            # Los usuarios sin mensajes en el buffer ya no hacen falta; limpiar solo
+            # al doblar el tamaño deja el coste amortizado en O(1)
+            limite = secuencia - self.por_chat
+            self._ultimo_por_usuario[hueco] = {u: s for u, s in ultimos.items() if s > limite}
+
+    def ultimos(self, chat_id: int, user_id: int, n: int) -> list[int]:
+        """Los ``n`` mensajes más recientes del usuario en el chat, del más antiguo al más nuevo."""
+        hueco = self._huecos.get(chat_id)
+        if hueco is None or n <= 0:
+            return []
+        ids = [self._ids[i] for i in self._indices_usuario(hueco, user_id, n)]
+        ids.reverse()
+        return ids
+
+    def recientes(self, chat_id: int, n: int) -> list[MensajeReciente]:
+        """Los ``n`` mensajes más recientes del chat, del más antiguo al más nuevo."""
+        hueco = self._huecos.get(chat_id)
+        if hueco is None or n <= 0:
+            return []
+        secuencia = self._secuencias[hueco]
+        base = hueco * self.por_chat
+        mensajes = []
+        for s in range(max(0, secuencia - min(n, self.por_chat)), secuencia):
+            i = base + s % self.por_chat
+            if self._ids[i]:
+                mensajes.append(MensajeReciente(self._ids[i], self._usuarios[i], self._horas[i], self._hashes[i]))
+        return mensajes
+
+    def olvidar(self, chat_id: int, user_id: int, message_ids: Iterable[int]) -> None:
+        """Marca como borrados los mensajes indicados del usuario."""
+        hueco = self._huecos.get(chat_id)
+        if hueco is None:
+            return
+        borrados = set(message_ids)
+        for i in self._indices_usuario(hueco, user_id, self.por_chat):
+            if self._ids[i] in borrados:
+                self._ids[i] = 0
+
+    def _indices_usuario(self, hueco: int, user_id: int, n: int) -> list[int]:
+        """Posiciones de los ``n`` últimos mensajes no olvidados del usuario, del más nuevo al más antiguo."""
+        secuencia = self._ultimo_por_usuario[hueco].get(user_id, -1)
+        limite = self._secuencias[hueco] - self.por_chat  # lo anterior ya se ha sobrescrito
+        base = hueco * self.por_chat
+        indices = []
+        while secuencia >= 0 and secuencia >= limite and len(indices) < n:
+            i = base + secuencia % self.por_chat
+            if self._ids[i]:
+                indices.append(i)
+            secuencia = self._anteriores[i]
+        return indices
+
+    def _asignar(self, chat_id: int) -> int:
+        if len(self._huecos) < self.max_chats:
+            hueco = len(self._huecos)
+        else:
+            _, hueco = self._huecos.popitem(last=False)
+            self._limpiar(hueco)
+        self._huecos[chat_id] = hueco
+        return hueco
+
+    def _limpiar(self, hueco: int) -> None:
+        # No hace falta borrar las entradas: con la secuencia a 0 y sin índice de
+        # usuarios ya no se leen, y se sobrescriben según llegan mensajes
+        self._secuencias[hueco] = 0
+        self._ultimo_por_usuario[hueco] = {}
+
+
+historial_mensajes = HistorialMensajes()
@@ -1,75 +1,279 @@
 
 import re
+import time
+import asyncio
 import logging
 import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional
 import instaloader
+from instaloader.exceptions import ConnectionException, TooManyRequestsException
+
+from config import INSTAGRAM_ENFRIAMIENTO, INSTAGRAM_SESIONES, INSTAGRAM_WORKERS
+from descargas import pool_descargas
 
 logger = logging.getLogger(__name__)
 
-async def download_instagram_post(url: str) -> list[tuple[str, bytes, str]]:
-    """Descarga un post de Instagram y devuelve el contenido de los archivos descargados
-    
+_PATRON_SHORTCODE = re.compile(r'instagram\.com/(?:p|reels|reel)/([^/?#]+)')
+
+
+class _RateControllerPool(instaloader.RateController):
+    """RateController que no se queda dormido ante un 429.
+
+    El de instaloader espera dentro del hilo hasta poder repetir la petición
+    (minutos); aquí se lanza la excepción para que el pool enfríe esa sesión
+    y la descarga falle enseguida.
+    """
+
+    def handle_429(self, query_type: str) -> None:
+        raise TooManyRequestsException(f"429 Too Many Requests ({query_type})")
+
+
+class _Sesion:
+    __slots__ = ("loader", "nombre", "usos", "enfriada_hasta")
+
+    def __init__(self, loader: instaloader.Instaloader, nombre: str):
+        self.loader = loader
+        self.nombre = nombre
+        self.usos = 0
+        self.enfriada_hasta = 0.0
+
+
+class PoolInstaloader:
+    """Pool de instancias de Instaloader de larga duración.
+
+    Cada instancia conserva su sesión HTTP (y su login, si se carga desde un
+    fichero de sesión) entre descargas. Las sesiones se prestan de una en una
+    y rotan en orden; la que recibe un 429 queda enfriándose ``enfriamiento``
+    segundos antes de volver a usarse.
+
+    Args:
+        tamano: número de instancias anónimas si no se indican sesiones.
+        sesiones: lista de (usuario, fichero) cuyas sesiones se cargan con
+            ``load_session_from_file``; si el fichero es None se usa la ruta
+            por defecto de instaloader.
+        enfriamiento: segundos que una sesión queda fuera tras un 429.
+    """
+
+    def __init__(
+        self,
+        tamano: int,
+        sesiones: Optional[list[tuple[str, Optional[str]]]] = None,
+        enfriamiento: float = 600,
+    ):
+        self._pendientes: list[tuple[str, Optional[str]]] = list(sesiones or [])
+        self._por_crear = len(self._pendientes) or tamano
+        self.enfriamiento = enfriamiento
+        self._libres: list[_Sesion] = []
+        self._condicion = threading.Condition()
+        self._creadas = 0
+        self._prestamos = 0
+        self._reutilizaciones = 0
+        self._backoffs = 0
+
+    def _crear(self) -> _Sesion:
+        loader = instaloader.Instaloader(
+            download_video_thumbnails=False,
+            save_metadata=False,
+            download_comments=False,
+            download_geotags=False,
+            download_pictures=True,
+            download_videos=True,
+            quiet=True,
+            rate_controller=_RateControllerPool,
+        )
+        nombre = f"anonima-{self._creadas}"
+        if self._pendientes:
+            usuario, fichero = self._pendientes.pop(0)
+            loader.load_session_from_file(usuario, fichero)
+            nombre = usuario
+        self._creadas += 1
+        logger.info("Creada sesión de Instaloader %s", nombre)
+        return _Sesion(loader, nombre)
+
+    def _prestar(self) -> _Sesion:
+        with self._condicion:
+            while True:
+                ahora = time.monotonic()
+                for i, sesion in enumerate(self._libres):
+                    if sesion.enfriada_hasta <= ahora:
+                        return self._libres.pop(i)
+                if self._creadas < self._por_crear:
+                    return self._crear()
+                if self._libres:
+                    # Todas las sesiones libres están enfriándose
+                    raise TooManyRequestsException("Todas las sesiones de Instagram están enfriándose")
+                self._condicion.wait()
+
+    def _devolver(self, sesion: _Sesion) -> None:
+        with self._condicion:
+            # Al final de la lista: la próxima descarga usa otra sesión
+            self._libres.append(sesion)
+            self._condicion.notify()
+
+    @contextmanager
+    def sesion(self) -> Iterator[instaloader.Instaloader]:
+        """Presta una instancia de Instaloader durante el bloque ``with``."""
+        sesion = self._prestar()
+        with self._condicion:
+            self._prestamos += 1
+            if sesion.usos:
+                self._reutilizaciones += 1
+        sesion.usos += 1
+        try:
+            yield sesion.loader
+        except ConnectionException as e:
+            # Los 429 de las descargas de ficheros llegan envueltos en ConnectionException
+            if not isinstance(e, TooManyRequestsException) and "429" not in str(e):
+                raise
+            sesion.enfriada_hasta = time.monotonic() + self.enfriamiento
+            with self._condicion:
+                self._backoffs += 1
+            logger.warning(
+                "Instagram devolvió 429 a la sesión %s; enfriándola %s segundos",
+                sesion.nombre, self.enfriamiento
+            )
+            raise
+        finally:
+            self._devolver(sesion)
+
+    def estadisticas(self) -> dict[str, int]:
+        """Contadores de uso del pool."""
+        with self._condicion:
+            ahora = time.monotonic()
+            return {
+                "creadas": self._creadas,
+                "prestamos": self._prestamos,
+                "reutilizaciones": self._reutilizaciones,
+                "backoffs": self._backoffs,
+                "libres": len(self._libres),
+                "enfriando": sum(1 for s in self._libres if s.enfriada_hasta > ahora),
+            }
+
+
+def _parse_sesiones(valor: str) -> list[tuple[str, Optional[str]]]:
+    """Convierte "usuario1:fichero1,usuario2" en [("usuario1", "fichero1"), ("usuario2", None)]."""
+    sesiones = []
+    for entrada in valor.split(","):
+        entrada = entrada.strip()
+        if not entrada:
+            continue
+        usuario, _, fichero = entrada.partition(":")
+        sesiones.append((usuario, fichero or None))
+    return sesiones
+
+
+pool_instaloader = PoolInstaloader(
+    tamano=INSTAGRAM_WORKERS,
+    sesiones=_parse_sesiones(INSTAGRAM_SESIONES),
+    enfriamiento=INSTAGRAM_ENFRIAMIENTO,
+)
+
+
+def extract_shortcode(url: str) -> Optional[str]:
+    """Extrae el código del post (shortcode) de una URL de Instagram"""
+    match = _PATRON_SHORTCODE.search(url)
+    return match.group(1) if match else None
+
+
+class PostDescargado:
+    """Ficheros de un post descargado, guardados en un directorio temporal.
+
+    Los ficheros se envían directamente desde el disco; el directorio se borra
+    al salir del bloque ``with`` (o al recolectarse el objeto si nadie lo usa,
+    por ejemplo cuando la descarga termina después del timeout).
+    """
+
+    def __init__(self, temp_dir: tempfile.TemporaryDirectory, archivos: list[tuple[Path, str]]):
+        self._temp_dir = temp_dir
+        # Lista de (ruta, tipo_mime) en el orden del carrusel
+        self.archivos = archivos
+
+    def __enter__(self) -> "PostDescargado":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.limpiar()
+
+    def limpiar(self) -> None:
+        self._temp_dir.cleanup()
+
+
+async def download_instagram_post(url: str) -> Optional[PostDescargado]:
+    """Descarga un post de Instagram a un directorio temporal
+
+    La descarga se ejecuta en el pool de descargas para no bloquear el event loop.
+    Quien recibe el post debe limpiarlo (``with post: ...``) tras enviarlo.
+
     Returns:
-        list[tuple[str, bytes, str]]: Lista de tuplas con (nombre_archivo, contenido_binario, tipo_mime)
+        Optional[PostDescargado]: El post descargado, o None si no se pudo descargar
+
+    Raises:
+        ColaLlena: si hay demasiadas descargas en curso.
     """
-    logger.info(f"Descargando post de Instagram: {url}")
+    logger.info("Descargando post de Instagram: %s", url)
     
     # Extraer el código del post de la URL
-    match = re.search(r'instagram\.com/(?:p|reels|reel)/([^/]+)', url)
-    if not match:
-        logger.error(f"No se pudo extraer el código del post de Instagram: {url}")
-        return []
-    
-    shortcode = match.group(1)
-    logger.info(f"Código extraído: {shortcode}")
-    
-    # Configurar instaloader
-    L = instaloader.Instaloader(
-        download_video_thumbnails=False,
-        save_metadata=False,
-        download_comments=False,
-        download_geotags=False,
-        download_pictures=True,
-        download_videos=True,
-    )
+    shortcode = extract_shortcode(url)
+    if shortcode is None:
+        logger.error("No se pudo extraer el código del post de Instagram: %s", url)
+        return None
     
+    logger.info("Código extraído: %s", shortcode)
+
+    try:
+        return await pool_descargas.ejecutar(_download_post, shortcode)
+    except asyncio.TimeoutError:
+        logger.error("Tiempo de espera agotado descargando el post de Instagram: %s", shortcode)
+        return None
+
+
+def _download_post(shortcode: str) -> Optional[PostDescargado]:
+    """Parte bloqueante de la descarga; se ejecuta en un hilo del pool."""
     try:
-        # Obtener el post
-        post = instaloader.Post.from_shortcode(L.context, shortcode)
-        
-        media_content = []
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            # Descargar el post
-            success = L.download_post(post, target=temp_path)
-            
-            if success:
-                # Recopilar todos los archivos descargados (imágenes y videos)
-                files = list(temp_path.glob('**/*'))
-                media_files = [f for f in files if f.is_file() and f.suffix.lower() in ['.jpg', '.jpeg', '.png', '.mp4']]
-                logger.info(f"Archivos descargados: {[str(f) for f in media_files]}")
-                
-                # Leer el contenido de los archivos dentro del contexto 'with'
-                for file_path in media_files:
-                    with open(file_path, 'rb') as f:
-                        content = f.read()
-                        
-                    # Determinar el tipo MIME basado en la extensión
-                    mime_type = ""
-                    if file_path.suffix.lower() in ['.jpg', '.jpeg']:
-                        mime_type = "image/jpeg"
-                    elif file_path.suffix.lower() == '.png':
-                        mime_type = "image/png"
-                    elif file_path.suffix.lower() == '.mp4':
-                        mime_type = "video/mp4"
-                        
-                    media_content.append((file_path.name, content, mime_type))
-                
-                return media_content
-            else:
-                logger.error("Error al descargar el post de Instagram")
-                return []
+        with pool_instaloader.sesion() as L:
+            return _download_post_with(L, shortcode)
     except Exception as e:
-        logger.error(f"Error descargando el post de Instagram: {str(e)}")
-        return []
+        logger.error("Error descargando el post de Instagram: %s", str(e))
+        return None
+
+
+_TIPOS_MIME = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".mp4": "video/mp4",
+}
+
+
+def _orden_natural(ruta: Path) -> list:
+    # "post_2.jpg" va antes que "post_10.jpg"
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", ruta.name)]
+
+
+def _download_post_with(L: instaloader.Instaloader, shortcode: str) -> Optional[PostDescargado]:
+    # Obtener el post
+    post = instaloader.Post.from_shortcode(L.context, shortcode)
+
+    temp_dir = tempfile.TemporaryDirectory()
+    try:
+        temp_path = Path(temp_dir.name)
+        # Descargar el post
+        success = L.download_post(post, target=temp_path)
+        if not success:
+            logger.error("Error al descargar el post de Instagram")
+            temp_dir.cleanup()
+            return None
+
+        # Recopilar todos los archivos descargados (imágenes y videos), sin leerlos
+        media_files = sorted(
+            (f for f in temp_path.glob('**/*') if f.is_file() and f.suffix.lower() in _TIPOS_MIME),
+            key=_orden_natural,
+        )
+        logger.info("Archivos descargados: %s", [str(f) for f in media_files])
+        return PostDescargado(temp_dir, [(f, _TIPOS_MIME[f.suffix.lower()]) for f in media_files])
+    except BaseException:
+        temp_dir.cleanup()
+        raise
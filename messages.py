@@ -6,4 +6,16 @@ MENSAJES_INTERVALOS =[
     "¡Perro Sanxe dimisión!",
     "¡Estírate un poco para evitar lesiones!",
     "¡Bocata lomo ya!"
-]
\ No newline at end of file
+]
+
+# MarkdownV2; {miembros} son las menciones de los que han entrado
+BIENVENIDA = (
+    "¡Bienvenido{plural} a Benalmádena Gang {miembros}\\!\n"
+    "Para poder ser aceptado en el grupo envía lo siguiente:\n"
+    "\\- Nombre real\n"
+    "\\- Edad\n"
+    "\\- Ciudad de residencia\n"
+    "\\- Objetos de valor y dónde los guarda\n"
+    "\\- Tipo sanguíneo\n"
+    "No nos hacemos responsables de daños o perjuicios hacia su propiedad privada \\(por favor consulta las /rules\\)"
+)
@@ -0,0 +1,155 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import HTTPXRequest, RequestData
+
+from cache_media import cache_media
+from descargas import pool_descargas
+from envios import CARRILES, limitador_envios
+from instagram import pool_instaloader
+from procesador import procesador_updates
+from servidor import Peticion, Respuesta
+
+logger = logging.getLogger(__name__)
+
+LATENCIA_HANDLERS = Histogram(
+    "bot_handler_duration_seconds",
+    "Duración de cada manejador de updates",
+    ["handler"],
+)
+API_HANDLERS = Histogram(
+    "bot_handler_api_seconds",
+    "Tiempo de cada manejador esperando llamadas a la Bot API",
+    ["handler"],
+)
+CPU_HANDLERS = Histogram(
+    "bot_handler_cpu_seconds",
+    "Tiempo de CPU de cada manejador (sin contar esperas)",
+    ["handler"],
+)
+ERRORES_HANDLERS = Counter(
+    "bot_handler_errors_total",
+    "Excepciones lanzadas por los manejadores",
+    ["handler"],
+)
+UPDATES = Counter(
+    "bot_updates_total",
+    "Updates recibidos por tipo",
+    ["tipo"],
+)
+LATENCIA_API = Histogram(
+    "bot_api_request_duration_seconds",
+    "Duración de las llamadas a la Bot API por método",
+    ["metodo"],
+)
+RESPUESTAS_API = Counter(
+    "bot_api_responses_total",
+    "Respuestas de la Bot API por método y código HTTP",
+    ["metodo", "codigo"],
+)
+RETRY_AFTER = Counter(
+    "bot_api_retry_after_total",
+    "Respuestas 429 (RetryAfter) de la Bot API por método",
+    ["metodo"],
+)
+JOBS = Gauge("bot_job_queue_jobs", "Jobs programados en la JobQueue")
+DESCARGAS = Gauge("bot_instagram_downloads_in_flight", "Descargas de Instagram en curso o en espera")
+CACHE_MEDIA_ACIERTOS = Gauge("bot_media_cache_hits", "Aciertos de la caché de medios")
+CACHE_MEDIA_FALLOS = Gauge("bot_media_cache_misses", "Fallos de la caché de medios")
+INSTALOADER_BACKOFFS = Gauge("bot_instaloader_backoffs", "Sesiones de Instaloader enfriadas por un 429")
+UPDATES_EN_CURSO = Gauge("bot_updates_in_progress", "Updates ejecutándose en sus manejadores")
+UPDATES_ADMITIDOS = Gauge("bot_updates_admitted", "Updates admitidos: en ejecución o esperando su turno en su chat")
+ENVIOS_PENDIENTES = Gauge(
+    "bot_outbound_queue_depth",
+    "Llamadas a la Bot API esperando turno por carril de prioridad",
+    ["carril"],
+)
+
+DESCARGAS.set_function(lambda: pool_descargas.trabajos)
+CACHE_MEDIA_ACIERTOS.set_function(lambda: cache_media.aciertos)
+CACHE_MEDIA_FALLOS.set_function(lambda: cache_media.fallos)
+INSTALOADER_BACKOFFS.set_function(lambda: pool_instaloader.estadisticas()["backoffs"])
+UPDATES_EN_CURSO.set_function(lambda: procesador_updates.en_curso)
+UPDATES_ADMITIDOS.set_function(lambda: procesador_updates.admitidos)
+for _carril, _nombre in enumerate(CARRILES):
+    ENVIOS_PENDIENTES.labels(_nombre).set_function(lambda c=_carril: limitador_envios.pendientes(c))
+
+
+class Medicion:
+    """Tiempos acumulados durante la ejecución de un manejador."""
+
+    __slots__ = ("api", "cpu", "secciones")
+
+    def __init__(self) -> None:
+        self.api = 0.0
+        self.cpu = 0.0
+        self.secciones: dict[str, float] = {}
+
+
+# Medición del manejador que se está ejecutando en la tarea actual
+medicion_actual: ContextVar[Optional[Medicion]] = ContextVar("medicion_actual", default=None)
+
+
+class RequestInstrumentado(HTTPXRequest):
+    """HTTPXRequest que mide cada llamada a la Bot API.
+
+    Todas las llamadas del bot pasan por aquí, así que se registra su latencia
+    y su código de respuesta por método, incluidos los 429. El tiempo también
+    se suma a la medición del manejador que hizo la llamada, si lo hay.
+    """
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        *args: Any,
+        **kwargs: Any,
+    ) -> tuple[int, bytes]:
+        metodo = url.rsplit("/", 1)[-1]
+        inicio = time.perf_counter()
+        codigo = 0
+        try:
+            codigo, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+            return codigo, payload
+        finally:
+            duracion = time.perf_counter() - inicio
+            LATENCIA_API.labels(metodo).observe(duracion)
+            medicion = medicion_actual.get()
+            if medicion is not None:
+                medicion.api += duracion
+            RESPUESTAS_API.labels(metodo, str(codigo)).inc()
+            if codigo == 429:
+                RETRY_AFTER.labels(metodo).inc()
+
+
+def tipo_update(update: Update) -> str:
+    for tipo in Update.ALL_TYPES:
+        if getattr(update, tipo, None) is not None:
+            return tipo
+    return "desconocido"
+
+
+async def contar_update(update: object, context: Any) -> None:
+    if isinstance(update, Update):
+        UPDATES.labels(tipo_update(update)).inc()
+
+
+def registrar_metricas(application: Application) -> None:
+    """Cuenta los updates por tipo y publica el tamaño de la JobQueue."""
+    # Grupo -1: se ejecuta antes que el resto y no interfiere con ellos
+    application.add_handler(TypeHandler(Update, contar_update), group=-1)
+
+    if application.job_queue is not None:
+        job_queue = application.job_queue
+        JOBS.set_function(lambda: len(job_queue.jobs()))
+
+
+async def metricas(peticion: Peticion) -> Respuesta:
+    """Endpoint /metrics en formato Prometheus"""
+    return Respuesta(200, generate_latest(), CONTENT_TYPE_LATEST)
@@ -0,0 +1,58 @@
+"""Migra los datos de PicklePersistence (persistence.pkl) a SQLitePersistence.
+
+Uso:
+    python migrar_pickle.py [persistence.pkl] [bot.db]
+"""
+
+import asyncio
+import logging
+import pickle
+import sys
+
+from config import DB_PATH
+from persistencia import SQLitePersistence
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+class _Unpickler(pickle.Unpickler):
+    # Las referencias al bot que guardó PicklePersistence se cargan como None
+    def persistent_load(self, pid: str) -> None:
+        return None
+
+
+async def migrar(origen: str, destino: str) -> None:
+    with open(origen, "rb") as f:
+        datos = _Unpickler(f).load()
+
+    persistencia = SQLitePersistence(filepath=destino)
+    for user_id, user_data in (datos.get("user_data") or {}).items():
+        await persistencia.update_user_data(user_id, user_data)
+    for chat_id, chat_data in (datos.get("chat_data") or {}).items():
+        await persistencia.update_chat_data(chat_id, chat_data)
+    if datos.get("bot_data"):
+        await persistencia.update_bot_data(datos["bot_data"])
+    if datos.get("callback_data"):
+        await persistencia.update_callback_data(datos["callback_data"])
+    for nombre, conversaciones in (datos.get("conversations") or {}).items():
+        for clave, estado in conversaciones.items():
+            await persistencia.update_conversation(nombre, clave, estado)
+    await persistencia.flush()
+
+    logger.info(
+        "Migrados %s usuarios, %s chats y %s conversaciones de %s a %s",
+        len(datos.get("user_data") or {}),
+        len(datos.get("chat_data") or {}),
+        len(datos.get("conversations") or {}),
+        origen,
+        destino,
+    )
+
+
+if __name__ == "__main__":
+    origen = sys.argv[1] if len(sys.argv) > 1 else "persistence.pkl"
+    destino = sys.argv[2] if len(sys.argv) > 2 else DB_PATH
+    asyncio.run(migrar(origen, destino))
@@ -0,0 +1,102 @@
+import re
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Palabras baneadas
+PALABRAS_BANEADAS = [
+    "menor",
+    "caldo de pollo",
+    "CP",
+    "menores",
+    "menor de edad",
+    "ex",
+]
+
+# Cualquier secuencia de caracteres que no forman palabra (espacios, signos...)
+_SEPARADORES = re.compile(r"\W+")
+
+# Marca de fin de término dentro del trie
+_FIN = ""
+
+
+def normalizar_termino(termino: str) -> str:
+    """Pasa un término a minúsculas y deja un único espacio entre sus palabras."""
+    return " ".join(_SEPARADORES.split(termino.lower())).strip()
+
+
+def _construir_trie(terminos: Iterable[str]) -> dict:
+    trie: dict = {}
+    for termino in terminos:
+        nodo = trie
+        for caracter in termino:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[_FIN] = True
+    return trie
+
+
+def _trie_a_regex(nodo: dict) -> str:
+    """Convierte el trie en una alternancia factorizada por prefijos.
+
+    Con miles de términos, una alternancia plana obliga al motor de regex a
+    probar cada término en cada posición; factorizando los prefijos comunes
+    solo se recorre la rama que coincide con el texto.
+    """
+    alternativas = []
+    for caracter in sorted(c for c in nodo if c != _FIN):
+        # Los espacios de los términos compuestos aceptan cualquier separador
+        literal = r"\W+" if caracter == " " else re.escape(caracter)
+        hijo = nodo[caracter]
+        if len(hijo) == 1 and _FIN in hijo:
+            alternativas.append(literal)
+        else:
+            alternativas.append(literal + _trie_a_regex(hijo))
+
+    if len(alternativas) == 1 and _FIN not in nodo:
+        return alternativas[0]
+    patron = "(?:" + "|".join(alternativas) + ")"
+    return patron + "?" if _FIN in nodo else patron
+
+
+class FiltroPalabras:
+    """Detector de palabras prohibidas compilado una sola vez.
+
+    Todos los términos se combinan en una única expresión regular con límites
+    de palabra, de modo que cada mensaje se recorre una sola vez sin importar
+    el tamaño de la lista. Los términos de varias palabras ("caldo de pollo")
+    coinciden aunque estén separados por signos de puntuación o varios espacios.
+    """
+
+    def __init__(self, terminos: Iterable[str]):
+        self._terminos: dict[str, str] = {}
+        for termino in terminos:
+            normalizado = normalizar_termino(termino)
+            if normalizado:
+                self._terminos.setdefault(normalizado, termino)
+
+        if self._terminos:
+            cuerpo = _trie_a_regex(_construir_trie(self._terminos))
+            self._patron = re.compile(rf"(?<!\w){cuerpo}(?!\w)")
+        else:
+            # Patrón que nunca coincide
+            self._patron = re.compile(r"(?!x)x")
+        logger.info("Filtro de palabras compilado con %s términos", len(self._terminos))
+
+    def __len__(self) -> int:
+        return len(self._terminos)
+
+    def buscar(self, texto: str) -> list[str]:
+        """Devuelve los términos prohibidos encontrados en el texto, sin repetir y en orden de aparición."""
+        encontrados: dict[str, None] = {}
+        for coincidencia in self._patron.finditer(texto.lower()):
+            normalizado = _SEPARADORES.sub(" ", coincidencia.group())
+            encontrados[self._terminos.get(normalizado, normalizado)] = None
+        return list(encontrados)
+
+    def contiene(self, texto: str) -> bool:
+        """Indica si el texto contiene al menos un término prohibido."""
+        return self._patron.search(texto.lower()) is not None
+
+
+filtro_palabras = FiltroPalabras(PALABRAS_BANEADAS)
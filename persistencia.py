@@ -0,0 +1,244 @@
+import asyncio
+import io
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+from typing import Any, Optional, Union
+
+from telegram import Bot
+from telegram.ext import BasePersistence, PersistenceInput
+
+# Tipos de los datos que maneja BasePersistence
+CallbackData = tuple[list[tuple[str, float, dict[str, Any]]], dict[str, str]]
+ConversationKey = tuple[Union[int, str], ...]
+ConversationDict = dict[ConversationKey, object]
+
+logger = logging.getLogger(__name__)
+
+# Tipos de dato guardados en la tabla
+_USER = "user"
+_CHAT = "chat"
+_BOT = "bot"
+_CALLBACK = "callback"
+_CONVERSACION = "conv:"
+
+_BOT_CONOCIDO = "bot"
+
+
+class _BotPickler(pickle.Pickler):
+    """Sustituye las referencias al bot por una marca, igual que PicklePersistence."""
+
+    def persistent_id(self, obj: object) -> Optional[str]:
+        if isinstance(obj, Bot):
+            return _BOT_CONOCIDO
+        return None
+
+
+class _BotUnpickler(pickle.Unpickler):
+    def __init__(self, bot: Optional[Bot], *args: Any, **kwargs: Any):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def persistent_load(self, pid: str) -> Optional[Bot]:
+        return self._bot if pid == _BOT_CONOCIDO else None
+
+
+class SQLitePersistence(BasePersistence[dict, dict, dict]):
+    """Persistencia incremental sobre SQLite en modo WAL.
+
+    A diferencia de PicklePersistence, que vuelve a escribir el fichero completo
+    en cada volcado, aquí cada usuario, chat o conversación es una fila: solo se
+    escriben las claves cuyo contenido ha cambiado desde la última escritura.
+    Los cambios se acumulan durante ``ventana_escritura`` segundos y se escriben
+    juntos en una sola transacción, fuera del event loop.
+
+    Nada se lee al crear el objeto; cada tabla se carga cuando la aplicación la
+    pide en su inicialización.
+
+    Args:
+        filepath: ruta de la base de datos SQLite.
+        store_data: qué datos se guardan (por defecto, todos).
+        update_interval: cada cuántos segundos la aplicación envía los cambios.
+        ventana_escritura: segundos durante los que se agrupan las escrituras.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+        ventana_escritura: float = 1.0,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = filepath
+        self.ventana_escritura = ventana_escritura
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock_db = threading.Lock()
+        self._lock_escritura = asyncio.Lock()
+        # Huella del último valor escrito de cada clave, para no repetir escrituras
+        self._huellas: dict[tuple[str, str], int] = {}
+        # Escrituras pendientes: (tipo, clave) -> datos serializados, o None para borrar
+        self._pendientes: dict[tuple[str, str], Optional[bytes]] = {}
+        self._tarea_escritura: Optional[asyncio.Task] = None
+
+    # Base de datos
+
+    def _conexion(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS persistencia ("
+                " tipo TEXT NOT NULL,"
+                " clave TEXT NOT NULL,"
+                " datos BLOB NOT NULL,"
+                " PRIMARY KEY (tipo, clave)) WITHOUT ROWID"
+            )
+        return self._db
+
+    def _serializar(self, obj: object) -> bytes:
+        buffer = io.BytesIO()
+        _BotPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+        return buffer.getvalue()
+
+    def _deserializar(self, datos: bytes) -> Any:
+        return _BotUnpickler(getattr(self, "bot", None), io.BytesIO(datos)).load()
+
+    def _cargar(self, tipo: str) -> dict[str, Any]:
+        with self._lock_db:
+            filas = self._conexion().execute(
+                "SELECT clave, datos FROM persistencia WHERE tipo = ?", (tipo,)
+            ).fetchall()
+        resultado = {}
+        for clave, datos in filas:
+            self._huellas[(tipo, clave)] = hash(datos)
+            resultado[clave] = self._deserializar(datos)
+        return resultado
+
+    def _escribir_lote(self, pendientes: dict[tuple[str, str], Optional[bytes]]) -> None:
+        with self._lock_db:
+            db = self._conexion()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO persistencia (tipo, clave, datos) VALUES (?, ?, ?)",
+                    [(tipo, clave, datos) for (tipo, clave), datos in pendientes.items() if datos is not None],
+                )
+                db.executemany(
+                    "DELETE FROM persistencia WHERE tipo = ? AND clave = ?",
+                    [tipo_clave for tipo_clave, datos in pendientes.items() if datos is None],
+                )
+
+    # Escrituras agrupadas
+
+    def _registrar(self, tipo: str, clave: str, obj: object) -> None:
+        datos = self._serializar(obj)
+        huella = hash(datos)
+        if self._huellas.get((tipo, clave)) == huella:
+            return
+        self._huellas[(tipo, clave)] = huella
+        self._pendientes[(tipo, clave)] = datos
+        self._programar_escritura()
+
+    def _registrar_borrado(self, tipo: str, clave: str) -> None:
+        if self._huellas.pop((tipo, clave), None) is None and (tipo, clave) not in self._pendientes:
+            return
+        self._pendientes[(tipo, clave)] = None
+        self._programar_escritura()
+
+    def _programar_escritura(self) -> None:
+        if self._tarea_escritura is None or self._tarea_escritura.done():
+            self._tarea_escritura = asyncio.create_task(self._escribir_tras_ventana())
+
+    async def _escribir_tras_ventana(self) -> None:
+        while self._pendientes:
+            await asyncio.sleep(self.ventana_escritura)
+            await self._escribir()
+
+    async def _escribir(self) -> None:
+        async with self._lock_escritura:
+            pendientes, self._pendientes = self._pendientes, {}
+            if not pendientes:
+                return
+            try:
+                await asyncio.to_thread(self._escribir_lote, pendientes)
+            except sqlite3.Error:
+                # Vuelven a la cola sin pisar los cambios que han llegado mientras
+                # tanto; la tarea de escritura lo reintenta tras otra ventana
+                for tipo_clave, datos in pendientes.items():
+                    self._pendientes.setdefault(tipo_clave, datos)
+                logger.exception("Persistencia: no se pudieron escribir %s claves, se reintentará", len(pendientes))
+                return
+            logger.debug("Persistencia: escritas %s claves", len(pendientes))
+
+    # Lectura
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {int(k): v for k, v in self._cargar(_USER).items()}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {int(k): v for k, v in self._cargar(_CHAT).items()}
+
+    async def get_bot_data(self) -> dict:
+        return self._cargar(_BOT).get("", {})
+
+    async def get_callback_data(self) -> Optional[CallbackData]:
+        return self._cargar(_CALLBACK).get("")
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        return {
+            tuple(json.loads(k)): v for k, v in self._cargar(_CONVERSACION + name).items()
+        }
+
+    # Escritura
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._registrar(_USER, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._registrar(_CHAT, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._registrar(_BOT, "", data)
+
+    async def update_callback_data(self, data: CallbackData) -> None:
+        self._registrar(_CALLBACK, "", data)
+
+    async def update_conversation(
+        self, name: str, key: ConversationKey, new_state: Optional[object]
+    ) -> None:
+        clave = json.dumps(list(key))
+        if new_state is None:
+            self._registrar_borrado(_CONVERSACION + name, clave)
+        else:
+            self._registrar(_CONVERSACION + name, clave, new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._registrar_borrado(_USER, str(user_id))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._registrar_borrado(_CHAT, str(chat_id))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Escribe los cambios pendientes y cierra la base de datos."""
+        await self._escribir()
+        if self._pendientes:
+            logger.error("Persistencia: se pierden %s claves sin escribir al cerrar", len(self._pendientes))
+        if self._tarea_escritura is not None:
+            self._tarea_escritura.cancel()
+            self._tarea_escritura = None
+        with self._lock_db:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
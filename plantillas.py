@@ -0,0 +1,204 @@
+import string
+from typing import Any
+
+from telegram import User
+
+from messages import BIENVENIDA as _BIENVENIDA
+from messages import MENSAJES_INTERVALOS, RULES_MESSAGE
+
+# Caracteres reservados de MarkdownV2 fuera de las entidades
+_ESPECIALES = "_*[]()~`>#+-=|{}.!\\"
+_TABLA_TEXTO = str.maketrans({c: "\\" + c for c in _ESPECIALES})
+# Dentro de `código` y ```bloques``` solo hay que escapar ` y \
+_TABLA_CODIGO = str.maketrans({c: "\\" + c for c in "`\\"})
+# Dentro del (enlace) de un [texto](enlace) solo hay que escapar ) y \
+_TABLA_ENLACE = str.maketrans({c: "\\" + c for c in ")\\"})
+
+_TEXTO = "texto"
+_CODIGO = "codigo"
+_ENLACE = "enlace"
+_TABLAS = {_TEXTO: _TABLA_TEXTO, _CODIGO: _TABLA_CODIGO, _ENLACE: _TABLA_ENLACE}
+
+# Marcas de uso privado que ocupan el lugar de los campos al validar
+_MARCA = 0xE000
+
+
+class Markdown(str):
+    """Texto que ya está en MarkdownV2 y se inserta en una plantilla sin escapar."""
+
+    __slots__ = ()
+
+
+def escapar(texto: Any) -> str:
+    """Escapa un texto cualquiera para insertarlo en un mensaje MarkdownV2."""
+    return str(texto).translate(_TABLA_TEXTO)
+
+
+def mencion(user: User) -> Markdown:
+    """Mención MarkdownV2 al usuario con su nombre completo."""
+    return Markdown(f"[{escapar(user.full_name)}](tg://user?id={user.id})")
+
+
+def _analizar(texto: str) -> dict[int, str]:
+    """Comprueba que ``texto`` es MarkdownV2 válido.
+
+    Devuelve el contexto (texto, código o enlace) de cada marca de campo que
+    contenga, para saber cómo escapar el valor que irá en su lugar. Lanza
+    ValueError si hay un carácter reservado sin escapar o entidades sin cerrar.
+    """
+    contextos: dict[int, str] = {}
+    pila: list[str] = []
+    i = 0
+    n = len(texto)
+
+    def error(motivo: str) -> ValueError:
+        return ValueError(f"MarkdownV2 inválido en la posición {i} ({motivo}): {texto!r}")
+
+    while i < n:
+        c = texto[i]
+        cima = pila[-1] if pila else None
+        if _MARCA <= ord(c) < _MARCA + 0x1000:
+            if cima in ("`", "```"):
+                contextos[i] = _CODIGO
+            elif cima == "(":
+                contextos[i] = _ENLACE
+            else:
+                contextos[i] = _TEXTO
+            i += 1
+        elif c == "\\":
+            if i + 1 >= n:
+                raise error("\\ al final")
+            i += 2
+        elif cima in ("`", "```"):
+            if texto.startswith(cima, i):
+                pila.pop()
+                i += len(cima)
+            elif c == "`":
+                raise error("` sin escapar dentro de código")
+            else:
+                i += 1
+        elif cima == "(":
+            if c == ")":
+                pila.pop()
+            i += 1
+        elif texto.startswith("```", i):
+            pila.append("```")
+            i += 3
+        else:
+            for marca in ("||", "__", "`", "*", "_", "~"):
+                if texto.startswith(marca, i):
+                    if cima == marca:
+                        pila.pop()
+                    elif marca in pila:
+                        raise error(f"{marca} mal anidado")
+                    else:
+                        pila.append(marca)
+                    i += len(marca)
+                    break
+            else:
+                if c == "[":
+                    pila.append("[")
+                elif c == "]":
+                    if cima != "[" or not texto.startswith("(", i + 1):
+                        raise error("] sin [ o sin (enlace)")
+                    pila[-1] = "("
+                    i += 1
+                elif c == ">" and (i == 0 or texto[i - 1] == "\n"):
+                    pass  # cita
+                elif c in _ESPECIALES:
+                    raise error(f"{c} sin escapar")
+                i += 1
+    if pila:
+        raise error(f"{pila[-1]} sin cerrar")
+    return contextos
+
+
+def validar(texto: str) -> str:
+    """Devuelve el texto si es MarkdownV2 válido; si no, lanza ValueError."""
+    _analizar(texto)
+    return texto
+
+
+class Plantilla:
+    """Mensaje MarkdownV2 con campos ``{nombre}`` que se validan al crearla.
+
+    El texto fijo ya debe estar escapado. Al crear la plantilla se comprueba
+    que es MarkdownV2 válido y se precalcula cómo escapar cada campo según dónde
+    esté (texto, `código` o enlace), así que rellenarla es solo unir trozos. Los
+    valores se escapan salvo que sean ``Markdown``.
+    """
+
+    __slots__ = ("texto", "campos", "_partes")
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        literales = []
+        nombres = []
+        for literal, campo, formato, conversion in string.Formatter().parse(texto):
+            if formato or conversion:
+                raise ValueError(f"Formato no soportado en el campo {campo!r}: {texto!r}")
+            literales.append(literal)
+            if campo is not None:
+                if not campo.isidentifier():
+                    raise ValueError(f"Campo inválido {campo!r}: {texto!r}")
+                nombres.append(campo)
+
+        # Se valida el esqueleto con una marca en lugar de cada campo: los valores
+        # escapados no pueden abrir ni cerrar entidades, así que el resultado
+        # siempre será válido.
+        esqueleto = ""
+        posiciones = []
+        for indice, literal in enumerate(literales):
+            esqueleto += literal
+            if indice < len(nombres):
+                posiciones.append(len(esqueleto))
+                esqueleto += chr(_MARCA + indice)
+        contextos = _analizar(esqueleto)
+
+        self.campos = frozenset(nombres)
+        self._partes = [
+            (literales[indice], nombre, _TABLAS[contextos[posiciones[indice]]])
+            for indice, nombre in enumerate(nombres)
+        ]
+        self._partes.append((literales[-1] if len(literales) > len(nombres) else "", None, None))
+
+    def __call__(self, **valores: Any) -> str:
+        trozos = []
+        for literal, nombre, tabla in self._partes:
+            trozos.append(literal)
+            if nombre is not None:
+                valor = valores[nombre]
+                trozos.append(valor if isinstance(valor, Markdown) else str(valor).translate(tabla))
+        return "".join(trozos)
+
+
+# Mensajes fijos: se validan y escapan una sola vez, al importar el módulo
+
+REGLAS = validar(RULES_MESSAGE)
+MENSAJES_AUTOMATICOS = tuple(escapar(mensaje) for mensaje in MENSAJES_INTERVALOS)
+PLUS_20 = escapar("+20€")
+
+# Plantillas
+
+INICIO = Plantilla(
+    "Hola, {usuario} soy Adolf,\n"
+    "estoy aquí para ayudarte\n"
+    "¿qué necitas\\?\n"
+    "manda fotopies"
+)
+BIENVENIDA = Plantilla(_BIENVENIDA)
+NO_AUTORIZADO = Plantilla("{usuario} la chupa")
+CHAT_ID = Plantilla("El ID del chat es: `{chat_id}`")
+BAN = Plantilla("Ban {usuario}")
+DESBAN = Plantilla("Desbaneado {usuario}")
+DESRESTRINGIDO = Plantilla("no la líes más {usuario}")
+ALERTA_CABECERA = Plantilla(
+    "\\[ALERTA\\] {total} {mensajes} sospechosos en el grupo *{grupo}* "
+    "\\(últimos {ventana} s\\)"
+)
+ALERTA_PALABRA = Plantilla("• `{palabra}`: {veces}")
+ALERTA_SPAM = Plantilla(
+    "• {veces} {mensajes} casi iguales a los de otros usuarios "
+    "\\(hasta {usuarios} usuarios en {chats} chats\\)"
+)
+ALERTA_MENSAJE = Plantilla("• [Ver mensaje]({enlace}) \\- {usuario}")
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import UPDATES_CONCURRENTES, UPDATES_PENDIENTES
+
+logger = logging.getLogger(__name__)
+
+
+class _ColaConContrapresion(asyncio.Queue):
+    """Cola de updates que solo entrega uno cuando el procesador tiene hueco.
+
+    Con la cola llena, el Updater deja de pedir updates a Telegram y el webhook
+    tarda en responder: la espera se traslada a Telegram en vez de acumular
+    tareas en memoria.
+    """
+
+    def __init__(self, procesador: "ProcesadorPorChat", maxsize: int):
+        super().__init__(maxsize)
+        self._procesador = procesador
+
+    async def get(self) -> Any:
+        await self._procesador._huecos.acquire()
+        try:
+            return await super().get()
+        except BaseException:
+            self._procesador._huecos.release()
+            raise
+
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """Procesa updates de chats distintos en paralelo y los de un mismo chat en orden.
+
+    Cada chat (o usuario, en las consultas inline) tiene su cerrojo: un update
+    espera a que termine el anterior del mismo chat sin ocupar ninguno de los
+    ``max_concurrentes`` huecos de ejecución, así que un grupo con mucho tráfico
+    no retrasa a los demás. Como mucho se admiten ``max_pendientes`` updates a
+    la vez (en ejecución o esperando su turno); por encima de eso la cola de la
+    aplicación deja de entregarlos.
+
+    Se usa con la cola que devuelve ``cola``::
+
+        Application.builder().update_queue(procesador.cola).concurrent_updates(procesador)
+    """
+
+    def __init__(self, max_concurrentes: int, max_pendientes: int):
+        if max_pendientes < max_concurrentes:
+            raise ValueError("max_pendientes no puede ser menor que max_concurrentes")
+        # El semáforo de la clase base no llega a bloquear: de eso se encarga la cola
+        super().__init__(max_pendientes)
+        self.max_concurrentes = max_concurrentes
+        self.max_pendientes = max_pendientes
+        self.en_curso = 0
+        self.admitidos = 0
+        self._ejecutando = asyncio.Semaphore(max_concurrentes)
+        # Uno por update entregado por la cola; se devuelve al terminar de procesarlo.
+        # La señal de parada de la aplicación también ocupa uno, pero ya da igual.
+        self._huecos = asyncio.Semaphore(max_pendientes)
+        self.cola = _ColaConContrapresion(self, max_pendientes)
+        # clave -> [cerrojo, updates que lo usan]
+        self._cerrojos: dict[int, list] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.admitidos += 1
+        try:
+            clave = clave_update(update)
+            if clave is None:
+                await self._ejecutar(coroutine)
+                return
+
+            entrada = self._cerrojos.get(clave)
+            if entrada is None:
+                entrada = self._cerrojos[clave] = [asyncio.Lock(), 0]
+            entrada[1] += 1
+            try:
+                async with entrada[0]:
+                    await self._ejecutar(coroutine)
+            finally:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._cerrojos[clave]
+        finally:
+            self.admitidos -= 1
+            self._huecos.release()
+
+    async def _ejecutar(self, coroutine: Awaitable[Any]) -> None:
+        async with self._ejecutando:
+            self.en_curso += 1
+            try:
+                await coroutine
+            finally:
+                self.en_curso -= 1
+
+
+def clave_update(update: object) -> Optional[int]:
+    """Chat del update (o usuario, si no hay chat): lo que debe procesarse en orden."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+procesador_updates = ProcesadorPorChat(UPDATES_CONCURRENTES, UPDATES_PENDIENTES)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from config import (
+    REDIRECCIONES_CONEXIONES,
+    REDIRECCIONES_MAX_ENTRADAS,
+    REDIRECCIONES_PRESUPUESTO,
+    REDIRECCIONES_SALTOS,
+    REDIRECCIONES_TIMEOUT,
+    REDIRECCIONES_TTL,
+)
+from urls import BLOQUEADO, INSTAGRAM, ArbolDominios, EnlacesMensaje, dominios
+
+logger = logging.getLogger(__name__)
+
+# Acortadores de enlaces cuyas redirecciones se siguen (incluye sus subdominios)
+DOMINIOS_ACORTADORES = [
+    "bit.ly", "t.ly", "tinyurl.com", "t.co", "goo.gl", "is.gd", "v.gd", "ow.ly", "buff.ly",
+    "cutt.ly", "rb.gy", "shorturl.at", "tiny.cc", "s.id", "rebrand.ly", "bl.ink", "short.io",
+]
+
+ACORTADOR = "acortador"
+
+_CODIGOS_REDIRECCION = frozenset({301, 302, 303, 307, 308})
+
+
+class ResolutorRedirecciones:
+    """Sigue las redirecciones de los enlaces acortados hasta la URL final.
+
+    Usa un único cliente HTTP con conexiones reutilizables y peticiones HEAD
+    (sin descargar el cuerpo), como mucho ``max_saltos`` redirecciones y
+    ``timeout`` segundos por petición. Solo se siguen los saltos que pasan por
+    un acortador: en cuanto la URL sale de ellos, esa es la final. Quien consulta
+    espera como mucho ``presupuesto`` segundos en total; si no basta, se queda con
+    la URL sin resolver y la petición sigue en segundo plano para llenar la caché.
+
+    Las URLs finales se guardan ``ttl`` segundos en una caché LRU de
+    ``max_entradas`` URLs, y si la misma URL se está resolviendo ya, las demás
+    consultas esperan a esa petición en vez de hacer otra.
+    """
+
+    def __init__(
+        self,
+        acortadores: Iterable[str] = DOMINIOS_ACORTADORES,
+        max_saltos: int = REDIRECCIONES_SALTOS,
+        timeout: float = REDIRECCIONES_TIMEOUT,
+        presupuesto: float = REDIRECCIONES_PRESUPUESTO,
+        ttl: float = REDIRECCIONES_TTL,
+        max_entradas: int = REDIRECCIONES_MAX_ENTRADAS,
+        max_conexiones: int = REDIRECCIONES_CONEXIONES,
+    ):
+        self.acortadores = ArbolDominios(acortadores, ACORTADOR)
+        self.max_saltos = max_saltos
+        self.timeout = timeout
+        self.presupuesto = presupuesto
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_conexiones = max_conexiones
+        self.peticiones = 0
+        # url -> (caduca, url final), de menos a más recientemente usada
+        self._entradas: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._en_curso: dict[str, asyncio.Task] = {}
+        self._cliente: Optional[httpx.AsyncClient] = None
+
+    def es_acortada(self, url: str) -> bool:
+        try:
+            hostname = urlsplit(url).hostname
+        except ValueError:
+            return False
+        return bool(hostname) and self.acortadores.buscar(hostname) is not None
+
+    async def resolver(self, url: str) -> str:
+        """Devuelve la URL a la que lleva ``url``, o ``url`` si no se puede resolver."""
+        entrada = self._entradas.get(url)
+        if entrada is not None:
+            if entrada[0] > time.monotonic():
+                self._entradas.move_to_end(url)
+                return entrada[1]
+            del self._entradas[url]
+
+        tarea = self._en_curso.get(url)
+        if tarea is None:
+            tarea = asyncio.create_task(self._resolver(url))
+            self._en_curso[url] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(url, None))
+        # shield: si se cancela uno de los que esperan (o se le acaba el
+        # presupuesto), la petición sigue para los demás
+        try:
+            return await asyncio.wait_for(asyncio.shield(tarea), self.presupuesto)
+        except asyncio.TimeoutError:
+            logger.warning("El enlace %s no se ha resuelto en %s s", url, self.presupuesto)
+            return url
+
+    async def resolver_todas(self, urls: Iterable[str]) -> list[str]:
+        """Resuelve todas las URLs a la vez."""
+        return list(await asyncio.gather(*(self.resolver(url) for url in urls)))
+
+    async def cerrar(self) -> None:
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    async def _resolver(self, url: str) -> str:
+        actual = url
+        try:
+            for _ in range(self.max_saltos):
+                if not self.es_acortada(actual):
+                    break
+                siguiente = await self._siguiente(actual)
+                if siguiente is None:
+                    break
+                actual = siguiente
+        except Exception as e:
+            # Cualquier fallo (de red, de URL o del propio httpx) deja el enlace
+            # sin resolver. No se guarda en caché: se vuelve a intentar en la próxima consulta
+            logger.warning("No se pudo resolver el enlace %s: %r", url, e)
+            return actual
+        self._guardar(url, actual)
+        if actual != url:
+            logger.info("Enlace %s resuelto a %s", url, actual)
+        return actual
+
+    async def _siguiente(self, url: str) -> Optional[str]:
+        """URL a la que redirige ``url``, o None si no redirige."""
+        cliente = self._obtener_cliente()
+        self.peticiones += 1
+        respuesta = await cliente.head(url)
+        if respuesta.status_code in (403, 405, 501):
+            # Algunos acortadores no aceptan HEAD: GET sin leer el cuerpo
+            async with cliente.stream("GET", url) as respuesta:
+                pass
+        if respuesta.status_code not in _CODIGOS_REDIRECCION:
+            return None
+        destino = respuesta.headers.get("location")
+        return urljoin(url, destino) if destino else None
+
+    def _obtener_cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            # Se crea al usarlo por primera vez, dentro del event loop que lo usará
+            self._cliente = httpx.AsyncClient(
+                follow_redirects=False,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_conexiones, max_keepalive_connections=self.max_conexiones
+                ),
+            )
+        return self._cliente
+
+    def _guardar(self, url: str, final: str) -> None:
+        self._entradas[url] = (time.monotonic() + self.ttl, final)
+        self._entradas.move_to_end(url)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+
+async def resolver_acortados(
+    enlaces: EnlacesMensaje,
+    resolutor: Optional[ResolutorRedirecciones] = None,
+    arbol: ArbolDominios = dominios,
+) -> EnlacesMensaje:
+    """Resuelve a la vez los enlaces acortados del mensaje y los vuelve a clasificar.
+
+    Un enlace acortado que lleva a un dominio bloqueado pasa a ``bloqueados`` (con
+    la URL original, que es la que aparece en el mensaje); si lleva a Instagram,
+    se añade la URL final a ``instagram``.
+    """
+    resolutor = resolutor or resolutor_redirecciones
+    acortados = [url for url in enlaces.otros if resolutor.es_acortada(url)]
+    if not acortados:
+        return enlaces
+
+    finales = await resolutor.resolver_todas(acortados)
+    for url, final in zip(acortados, finales):
+        try:
+            hostname = urlsplit(final).hostname
+        except ValueError:
+            continue
+        clasificacion = arbol.buscar(hostname) if hostname else None
+        if clasificacion == BLOQUEADO:
+            enlaces.otros.remove(url)
+            enlaces.bloqueados.append(url)
+        elif clasificacion == INSTAGRAM:
+            enlaces.otros.remove(url)
+            enlaces.instagram.append(final)
+    return enlaces
+
+
+resolutor_redirecciones = ResolutorRedirecciones()
@@ -0,0 +1,114 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import LOG_FORMATO, LOG_MAX_POR_SEGUNDO, LOG_MUESTRA, LOG_NIVEL
+
+# Atributos que tiene cualquier LogRecord; el resto vienen de extra={...}
+_ATRIBUTOS_RECORD = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+FORMATO_TEXTO = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Logger de los registros que se generan con cada mensaje; se muestrean
+logger_mensajes = logging.getLogger("mensajes")
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de ``extra`` al mismo nivel."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerDiferido(QueueHandler):
+    """QueueHandler que no formatea nada en el hilo que registra.
+
+    El QueueHandler estándar formatea el mensaje antes de encolarlo; aquí el
+    registro se encola tal cual y se formatea en el hilo del QueueListener. Los
+    argumentos del mensaje no deben modificarse después de registrarlo.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar una fracción ``muestra`` de los registros, y como mucho
+    ``max_por_segundo`` por segundo. Los avisos y errores pasan siempre.
+    """
+
+    def __init__(self, muestra: float, max_por_segundo: float):
+        super().__init__()
+        self.muestra = muestra
+        self.max_por_segundo = max_por_segundo
+        self.descartados = 0
+        self._fichas = max_por_segundo
+        self._ultimo = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.muestra < 1 and random.random() >= self.muestra:
+            self.descartados += 1
+            return False
+        ahora = time.monotonic()
+        self._fichas = min(self.max_por_segundo, self._fichas + (ahora - self._ultimo) * self.max_por_segundo)
+        self._ultimo = ahora
+        if self._fichas < 1:
+            self.descartados += 1
+            return False
+        self._fichas -= 1
+        return True
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configurar_registro(
+    nivel: str = LOG_NIVEL,
+    formato: str = LOG_FORMATO,
+    muestra: float = LOG_MUESTRA,
+    max_por_segundo: float = LOG_MAX_POR_SEGUNDO,
+) -> None:
+    """Envía todo el logging a un hilo aparte a través de una cola.
+
+    Los manejadores solo encolan el registro; el formateo y la escritura en
+    stdout se hacen en el hilo del QueueListener, así que una consola o un disco
+    lentos no bloquean el event loop. ``formato`` es "json" o "texto".
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormateadorJSON() if formato == "json" else logging.Formatter(FORMATO_TEXTO))
+    cola: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(cola, salida, respect_handler_level=True)
+
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(_QueueHandlerDiferido(cola))
+    raiz.setLevel(nivel.upper())
+    logger_mensajes.addFilter(FiltroMuestreo(muestra, max_por_segundo))
+
+    _listener.start()
+    # Al salir se vacía la cola antes de terminar
+    atexit.register(_listener.stop)
@@ -0,0 +1,177 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo del cuerpo de una petición (los updates de Telegram son pequeños)
+MAX_CUERPO = 1024 * 1024
+TIMEOUT_LECTURA = 30
+
+_RAZONES = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class Peticion:
+    __slots__ = ("metodo", "ruta", "cabeceras", "cuerpo")
+
+    def __init__(self, metodo: str, ruta: str, cabeceras: dict[str, str], cuerpo: bytes):
+        self.metodo = metodo
+        self.ruta = ruta
+        self.cabeceras = cabeceras  # con los nombres en minúsculas
+        self.cuerpo = cuerpo
+
+
+class Respuesta:
+    __slots__ = ("estado", "cuerpo", "tipo")
+
+    def __init__(self, estado: int = 200, cuerpo: bytes = b"", tipo: str = "text/plain; charset=utf-8"):
+        self.estado = estado
+        self.cuerpo = cuerpo
+        self.tipo = tipo
+
+
+Manejador = Callable[[Peticion], Awaitable[Respuesta]]
+
+
+class ServidorHTTP:
+    """Servidor HTTP/1.1 mínimo que corre en el mismo event loop que el bot.
+
+    Sustituye al ThreadingHTTPServer en su propio hilo: atiende el health check
+    y, en modo webhook, recibe los updates de Telegram. Cada conexión se atiende
+    en su propia tarea, así que las peticiones se procesan de forma concurrente.
+    """
+
+    def __init__(self, host: str, puerto: int):
+        self.host = host
+        self.puerto = puerto
+        self._rutas: dict[str, dict[str, Manejador]] = {}
+        self._servidor: Optional[asyncio.Server] = None
+
+    def ruta(self, metodo: str, ruta: str, manejador: Manejador) -> None:
+        self._rutas.setdefault(ruta, {})[metodo.upper()] = manejador
+
+    async def start(self) -> None:
+        self._servidor = await asyncio.start_server(self._atender, self.host or None, self.puerto)
+        logger.info("Iniciando servidor HTTP en el puerto %s", self.puerto)
+
+    async def stop(self) -> None:
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+            logger.info("Servidor HTTP cerrado.")
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                peticion = await asyncio.wait_for(self._leer(reader), TIMEOUT_LECTURA)
+                if peticion is None:
+                    break
+                if isinstance(peticion, Respuesta):
+                    await self._escribir(writer, peticion, cerrar=True)
+                    break
+                respuesta = await self._despachar(peticion)
+                cerrar = peticion.cabeceras.get("connection", "").lower() == "close"
+                await self._escribir(writer, respuesta, cerrar)
+                if cerrar:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _leer(self, reader: asyncio.StreamReader) -> Optional[Union[Peticion, Respuesta]]:
+        try:
+            cabecera = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None  # El cliente cerró la conexión
+            raise
+        except asyncio.LimitOverrunError:
+            return Respuesta(413)
+
+        lineas = cabecera.decode("latin-1").split("\r\n")
+        try:
+            metodo, ruta, _version = lineas[0].split(" ", 2)
+        except ValueError:
+            return Respuesta(400)
+        cabeceras = {}
+        for linea in lineas[1:]:
+            nombre, _, valor = linea.partition(":")
+            if nombre:
+                cabeceras[nombre.strip().lower()] = valor.strip()
+
+        try:
+            longitud = int(cabeceras.get("content-length", 0))
+        except ValueError:
+            return Respuesta(400)
+        if longitud > MAX_CUERPO:
+            return Respuesta(413)
+        cuerpo = await reader.readexactly(longitud) if longitud else b""
+        return Peticion(metodo.upper(), ruta.split("?", 1)[0], cabeceras, cuerpo)
+
+    async def _despachar(self, peticion: Peticion) -> Respuesta:
+        metodos = self._rutas.get(peticion.ruta)
+        if metodos is None:
+            return Respuesta(404)
+        manejador = metodos.get(peticion.metodo)
+        if manejador is None:
+            return Respuesta(405)
+        try:
+            return await manejador(peticion)
+        except Exception as e:
+            logger.error("Error atendiendo %s %s: %s", peticion.metodo, peticion.ruta, e)
+            return Respuesta(500)
+
+    async def _escribir(self, writer: asyncio.StreamWriter, respuesta: Respuesta, cerrar: bool) -> None:
+        cabecera = (
+            f"HTTP/1.1 {respuesta.estado} {_RAZONES.get(respuesta.estado, '')}\r\n"
+            f"Content-Type: {respuesta.tipo}\r\n"
+            f"Content-Length: {len(respuesta.cuerpo)}\r\n"
+            f"Connection: {'close' if cerrar else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(cabecera.encode("latin-1") + respuesta.cuerpo)
+        await writer.drain()
+
+
+async def salud(peticion: Peticion) -> Respuesta:
+    """Health check"""
+    return Respuesta(200, b"Hello, world!", "text/html")
+
+
+def crear_webhook(application: Application, secret_token: Optional[str]) -> Manejador:
+    """Crea el manejador que recibe los updates de Telegram y los encola en la aplicación.
+
+    Si hay secret_token, solo se aceptan peticiones con la cabecera
+    X-Telegram-Bot-Api-Secret-Token correspondiente.
+    """
+    secreto = secret_token.encode() if secret_token else None
+
+    async def webhook(peticion: Peticion) -> Respuesta:
+        if secreto is not None:
+            recibido = peticion.cabeceras.get("x-telegram-bot-api-secret-token", "").encode()
+            if not hmac.compare_digest(recibido, secreto):
+                logger.warning("Petición al webhook rechazada: secret token incorrecto")
+                return Respuesta(403)
+        try:
+            update = Update.de_json(json.loads(peticion.cuerpo), application.bot)
+        except Exception as e:
+            logger.error("Update inválido recibido en el webhook: %s", e)
+            return Respuesta(400)
+        await application.update_queue.put(update)
+        return Respuesta(200)
+
+    return webhook
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+from multiprocessing.process import BaseProcess
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, generate_latest
+from telegram import Chat, Update
+from telegram.ext import Application, ContextTypes, PersistenceInput, TypeHandler
+
+from config import BOT_MODE, ENVIOS_POR_MINUTO_GRUPO, ENVIOS_POR_SEGUNDO, SHARD_MAX_PENDIENTES
+from procesador import clave_update
+from servidor import Peticion, Respuesta
+from simhash import CAMPO_DUPLICADO, indice_huellas
+
+logger = logging.getLogger(__name__)
+
+# Updates que un worker saca de su cola de una vez
+MAX_LOTE = 256
+# Cada cuántos segundos se comprueba que los workers siguen vivos
+VIGILANCIA = 5
+
+# Métricas del proceso frontal; las de los manejadores están en cada worker
+UPDATES_REPARTIDOS = Counter(
+    "bot_shard_updates_total",
+    "Updates enviados a cada worker",
+    ["worker"],
+)
+REINICIOS_WORKERS = Counter(
+    "bot_shard_restarts_total",
+    "Workers reiniciados tras terminar inesperadamente",
+)
+WORKERS_VIVOS = Gauge(
+    "bot_shard_workers_alive",
+    "Workers en ejecución",
+)
+
+
+def shard_de(clave: int, total: int) -> int:
+    """Worker que atiende al chat (o usuario) ``clave``; se puede calcular igual en SQL."""
+    return abs(clave) % total
+
+
+class Enrutador:
+    """Proceso frontal del modo sharding: reparte los updates entre ``total`` workers.
+
+    Cada worker es un proceso con su propia Application y todos los manejadores, y
+    atiende los chats cuyo ``shard_de(chat_id)`` es su índice. Los updates de un
+    chat van siempre al mismo worker por una cola FIFO y allí los procesa
+    ProcesadorPorChat, así que se conserva el orden dentro de cada chat.
+
+    El estado por chat (admins, flood, historial, bienvenidas, alertas) se queda
+    en el worker del chat. Lo que cruza chats se resuelve aquí (la detección de
+    spam repetido, que viaja con el update) o en tablas propias de la base de
+    datos común (caché de medios y borrados programados). La persistencia de PTB
+    de los workers solo guarda los datos por chat: ``bot_data`` y ``user_data``
+    no se reparten por chat, y cada worker sobrescribiría los de los demás.
+    """
+
+    def __init__(self, token: str, total: int, max_pendientes: int = SHARD_MAX_PENDIENTES):
+        self.token = token
+        self.total = total
+        # spawn: cada worker importa los módulos de cero y abre sus propias
+        # conexiones a SQLite, en vez de heredar las del proceso frontal
+        self._contexto = multiprocessing.get_context("spawn")
+        self._colas = [self._contexto.Queue(max_pendientes) for _ in range(total)]
+        self._procesos: list[Optional[BaseProcess]] = [None] * total
+        WORKERS_VIVOS.set_function(
+            lambda: sum(1 for proceso in self._procesos if proceso is not None and proceso.is_alive())
+        )
+
+    async def iniciar(self, application: Application) -> None:
+        for indice in range(self.total):
+            self._arrancar(indice)
+        if application.job_queue is not None:
+            application.job_queue.run_repeating(self._vigilar, VIGILANCIA, name="vigilar_workers")
+
+    async def detener(self, application: Application) -> None:
+        for indice, cola in enumerate(self._colas):
+            try:
+                await asyncio.to_thread(cola.put, None, True, 30)
+            except queue.Full:
+                logger.error("No se pudo avisar al worker %s para que termine", indice)
+        for indice, proceso in enumerate(self._procesos):
+            if proceso is None:
+                continue
+            await asyncio.to_thread(proceso.join, 30)
+            if proceso.is_alive():
+                logger.error("El worker %s no ha terminado a tiempo; se detiene a la fuerza", indice)
+                proceso.terminate()
+
+    async def repartir(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not isinstance(update, Update):
+            return
+        clave = clave_update(update)
+        datos = update.to_dict()
+        mensaje = update.effective_message
+        chat = update.effective_chat
+        user = update.effective_user
+        if mensaje is not None and mensaje.text and chat is not None and chat.type != Chat.PRIVATE and user:
+            # El índice de huellas necesita ver todos los chats, así que vive aquí
+            duplicado = indice_huellas.registrar(chat.id, user.id, mensaje.text)
+            datos[CAMPO_DUPLICADO] = list(duplicado) if duplicado is not None else None
+
+        indice = shard_de(clave or 0, self.total)
+        cola = self._colas[indice]
+        UPDATES_REPARTIDOS.labels(str(indice)).inc()
+        texto = json.dumps(datos)
+        try:
+            cola.put_nowait(texto)
+        except queue.Full:
+            # Los updates se procesan de uno en uno, así que esperar aquí frena la
+            # recepción sin desordenar nada
+            await asyncio.to_thread(cola.put, texto)
+
+    def _arrancar(self, indice: int) -> None:
+        proceso = self._contexto.Process(
+            target=_proceso_worker,
+            args=(indice, self.total, self._colas[indice], self.token),
+            name=f"worker-{indice}",
+        )
+        proceso.start()
+        self._procesos[indice] = proceso
+        logger.info("Worker %s de %s iniciado (pid %s)", indice, self.total, proceso.pid)
+
+    async def _vigilar(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        for indice, proceso in enumerate(self._procesos):
+            if proceso is not None and not proceso.is_alive():
+                # Se pierden los updates que estuviera procesando, pero no los que
+                # siguen en su cola
+                logger.error("El worker %s ha terminado (código %s); se reinicia", indice, proceso.exitcode)
+                REINICIOS_WORKERS.inc()
+                self._arrancar(indice)
+
+
+def build_frontal(token: str, total: int) -> Application:
+    """Crea la aplicación del proceso frontal, que solo recibe updates y los reparte."""
+    enrutador = Enrutador(token, total)
+    builder = (
+        Application.builder()
+        .token(token)
+        # Con la cola llena se deja de aceptar updates (polling o webhook)
+        .update_queue(asyncio.Queue(SHARD_MAX_PENDIENTES))
+        .post_init(enrutador.iniciar)
+        .post_stop(enrutador.detener)
+    )
+    if BOT_MODE == "webhook":
+        builder = builder.updater(None)
+    application = builder.build()
+    # Sin concurrent_updates: se reparten de uno en uno, en el orden en que llegan
+    application.add_handler(TypeHandler(Update, enrutador.repartir))
+    return application
+
+
+async def metricas_frontal(peticion: Peticion) -> Respuesta:
+    """Endpoint /metrics del proceso frontal en formato Prometheus"""
+    return Respuesta(200, generate_latest(), CONTENT_TYPE_LATEST)
+
+
+def _proceso_worker(indice: int, total: int, cola: multiprocessing.Queue, token: str) -> None:
+    # Ctrl+C llega a todo el grupo de procesos; el frontal avisa a los workers por la cola
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from aplicacion import build_application
+    from borrado import borrado_programado
+    from envios import LimitadorEnvios
+    from registro import configurar_registro
+
+    configurar_registro()
+    borrado_programado.configurar_shard(indice, total)
+    # El límite global de la Bot API es por bot: se reparte entre los workers
+    limitador = LimitadorEnvios(ENVIOS_POR_SEGUNDO / total, ENVIOS_POR_MINUTO_GRUPO)
+    application = build_application(
+        token,
+        rate_limiter=limitador,
+        recibir_updates=False,
+        store_data=PersistenceInput(bot_data=False, user_data=False, callback_data=False),
+    )
+    # post_stop (aplicacion.cerrar) escribe lo pendiente y para el pool de descargas
+    asyncio.run(_atender_cola(application, cola))
+
+
+async def _atender_cola(application: Application, cola: multiprocessing.Queue) -> None:
+    async with application:
+        await application.start()
+        try:
+            while True:
+                for texto in await asyncio.to_thread(_recibir, cola):
+                    if texto is None:
+                        # Al parar, PTB descarta lo que quede en update_queue
+                        await application.update_queue.join()
+                        return
+                    update = Update.de_json(json.loads(texto), application.bot)
+                    await application.update_queue.put(update)
+        finally:
+            await application.stop()
+            if application.post_stop is not None:
+                await application.post_stop(application)
+
+
+def _recibir(cola: multiprocessing.Queue) -> list[Optional[str]]:
+    """Espera al siguiente update y se lleva también los que ya estén en la cola."""
+    lote = [cola.get()]
+    while len(lote) < MAX_LOTE:
+        try:
+            lote.append(cola.get_nowait())
+        except queue.Empty:
+            break
+    return lote
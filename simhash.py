@@ -0,0 +1,261 @@
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from telegram import Update
+
+from config import (
+    SPAM_CHATS,
+    SPAM_DISTANCIA,
+    SPAM_MAX_HUELLAS,
+    SPAM_MIN_CARACTERES,
+    SPAM_USUARIOS,
+    SPAM_VENTANA,
+)
+
+BITS = 64
+# Longitud de los trozos de texto (n-gramas de caracteres) que forman la huella
+SHINGLE = 3
+# Caracteres que se miran de cada mensaje; también limita los contadores de 16 bits
+MAX_CARACTERES = 4096
+# Grupos por valor de banda; con más, se olvidan los más antiguos de esa banda
+MAX_POR_BANDA = 32
+
+# Solo letras: los números y emojis cambian mucho entre copias del mismo spam
+_PALABRA = re.compile(r"[^\W\d_]+")
+# Diacríticos combinables, que quedan sueltos al descomponer con NFKD
+_SIN_TILDES = dict.fromkeys(range(0x300, 0x370))
+
+# Para sumar las huellas de todos los trozos a la vez, cada bit del hash se
+# expande a un contador de 16 bits de un entero grande; sumar esos enteros
+# cuenta, para cada bit, en cuántos trozos vale 1. _EXPANSION[j][b] es el byte
+# b expandido y desplazado a la posición del byte j del hash.
+_ANCHO = 16
+_EXPANSION = [
+    [
+        sum(1 << (_ANCHO * (8 * j + bit)) for bit in range(8) if b >> bit & 1)
+        for b in range(256)
+    ]
+    for j in range(8)
+]
+
+# Trozos ya expandidos (unos 170 bytes cada uno); en un idioma hay pocos miles
+MAX_EXPANDIDOS = 50_000
+_expandidos: dict[str, int] = {}
+
+
+def _expandir(trozo: str) -> int:
+    h = hash(trozo)
+    e0, e1, e2, e3, e4, e5, e6, e7 = _EXPANSION
+    return (
+        e0[h & 255] + e1[h >> 8 & 255] + e2[h >> 16 & 255] + e3[h >> 24 & 255]
+        + e4[h >> 32 & 255] + e5[h >> 40 & 255] + e6[h >> 48 & 255] + e7[h >> 56 & 255]
+    )
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes y solo palabras, para que la puntuación y los espacios no cuenten."""
+    texto = unicodedata.normalize("NFKD", texto[:MAX_CARACTERES].lower()).translate(_SIN_TILDES)
+    return " ".join(_PALABRA.findall(texto))
+
+
+def simhash(texto: str) -> int:
+    """Huella SimHash de 64 bits del texto (ya normalizado).
+
+    Textos parecidos tienen huellas a poca distancia de Hamming. Se usa el hash
+    de Python, así que las huellas solo son comparables dentro del proceso.
+    """
+    trozos = {texto[i:i + SHINGLE] for i in range(max(1, len(texto) - SHINGLE + 1))}
+    suma = 0
+    for trozo in trozos:
+        expandido = _expandidos.get(trozo)
+        if expandido is None:
+            expandido = _expandir(trozo)
+            if len(_expandidos) < MAX_EXPANDIDOS:
+                _expandidos[trozo] = expandido
+        suma += expandido
+    contadores = array("H", suma.to_bytes(BITS * _ANCHO // 8, "little"))
+    if sys.byteorder == "big":
+        # array usa el orden de bytes de la máquina
+        contadores.byteswap()
+    mitad = len(trozos) / 2
+    huella = 0
+    for bit, contador in enumerate(contadores):
+        if contador > mitad:
+            huella |= 1 << bit
+    return huella
+
+
+# Campo que el proceso frontal del modo sharding añade al update con el resultado
+# de su índice, que es el único que ve todos los chats (ver sharding.py)
+CAMPO_DUPLICADO = "duplicado_spam"
+
+
+class Duplicado(NamedTuple):
+    huella: int
+    usuarios: int  # usuarios distintos que lo han enviado dentro de la ventana
+    chats: int  # chats distintos en los que se ha enviado dentro de la ventana
+
+
+class _Grupo:
+    """Mensajes casi iguales: su primera huella y quién y dónde los ha enviado."""
+
+    __slots__ = ("huella", "usuarios", "chats")
+
+    def __init__(self, huella: int):
+        self.huella = huella
+        # id -> hora de su último mensaje, del más antiguo al más reciente
+        self.usuarios: dict[int, float] = {}
+        self.chats: dict[int, float] = {}
+
+
+class IndiceHuellas:
+    """Detecta el mismo texto, con pequeñas variaciones, enviado por muchos
+    usuarios o en muchos chats.
+
+    Los mensajes cuyas huellas están a distancia de Hamming ``max_distancia`` o
+    menos de la de un grupo se suman a ese grupo. Para encontrarlo sin comparar
+    con todas las huellas, la huella se parte en ``max_distancia + 1`` bandas:
+    dos huellas a esa distancia coinciden al menos en una banda entera, así que
+    basta con mirar los grupos que comparten alguna banda.
+
+    Un grupo se da por spam cuando lo han enviado ``max_usuarios`` usuarios
+    distintos o se ha enviado en ``max_chats`` chats distintos dentro de
+    ``ventana`` segundos. Los grupos sin mensajes en ``ventana`` segundos se
+    olvidan, y como mucho se guardan ``max_grupos``, cada uno con a lo sumo
+    ``max_usuarios`` usuarios y ``max_chats`` chats: la memoria está acotada.
+    """
+
+    def __init__(
+        self,
+        max_usuarios: int = SPAM_USUARIOS,
+        max_chats: int = SPAM_CHATS,
+        ventana: float = SPAM_VENTANA,
+        max_distancia: int = SPAM_DISTANCIA,
+        max_grupos: int = SPAM_MAX_HUELLAS,
+        min_caracteres: int = SPAM_MIN_CARACTERES,
+    ):
+        if not 0 <= max_distancia < 16:
+            raise ValueError("max_distancia debe estar entre 0 y 15")
+        self.max_usuarios = max_usuarios
+        self.max_chats = max_chats
+        self.ventana = ventana
+        self.max_distancia = max_distancia
+        self.max_grupos = max_grupos
+        self.min_caracteres = min_caracteres
+        bandas = max_distancia + 1
+        ancho = BITS // bandas
+        # (desplazamiento, máscara) de cada banda; la última se queda los bits sobrantes
+        self._bandas = [
+            (i * ancho, (1 << (ancho if i < bandas - 1 else BITS - i * ancho)) - 1)
+            for i in range(bandas)
+        ]
+        # Grupos por hora de su último mensaje, del más antiguo al más reciente
+        self._grupos: OrderedDict[int, _Grupo] = OrderedDict()
+        # (banda, valor de la banda) -> {id del grupo: huella}, del más antiguo al más reciente
+        self._indice: dict[tuple[int, int], dict[int, int]] = {}
+        self._siguiente_id = 0
+
+    def __len__(self) -> int:
+        return len(self._grupos)
+
+    def registrar(
+        self, chat_id: int, user_id: int, texto: str, ahora: Optional[float] = None
+    ) -> Optional[Duplicado]:
+        """Registra un mensaje; si es spam repetido devuelve su Duplicado, si no None."""
+        texto = normalizar(texto)
+        if len(texto) < self.min_caracteres:
+            return None
+        if ahora is None:
+            ahora = time.monotonic()
+        self._caducar(ahora)
+
+        huella = simhash(texto)
+        grupo_id = self._buscar(huella)
+        if grupo_id is None:
+            grupo_id = self._crear(huella)
+        else:
+            self._grupos.move_to_end(grupo_id)
+        grupo = self._grupos[grupo_id]
+
+        _anotar(grupo.usuarios, user_id, ahora, self.ventana, self.max_usuarios)
+        _anotar(grupo.chats, chat_id, ahora, self.ventana, self.max_chats)
+        if len(grupo.usuarios) >= self.max_usuarios or len(grupo.chats) >= self.max_chats:
+            return Duplicado(grupo.huella, len(grupo.usuarios), len(grupo.chats))
+        return None
+
+    def _buscar(self, huella: int) -> Optional[int]:
+        indice = self._indice
+        max_distancia = self.max_distancia
+        for banda, (desplazamiento, mascara) in enumerate(self._bandas):
+            candidatos = indice.get((banda, huella >> desplazamiento & mascara))
+            if candidatos:
+                for grupo_id, otra in candidatos.items():
+                    if (otra ^ huella).bit_count() <= max_distancia:
+                        return grupo_id
+        return None
+
+    def _crear(self, huella: int) -> int:
+        if len(self._grupos) >= self.max_grupos:
+            self._olvidar(*self._grupos.popitem(last=False))
+        grupo_id = self._siguiente_id
+        self._siguiente_id += 1
+        self._grupos[grupo_id] = _Grupo(huella)
+        for banda, (desplazamiento, mascara) in enumerate(self._bandas):
+            candidatos = self._indice.setdefault((banda, huella >> desplazamiento & mascara), {})
+            candidatos[grupo_id] = huella
+            if len(candidatos) > MAX_POR_BANDA:
+                # Acota lo que cuesta buscar si muchas huellas comparten banda; el
+                # grupo sigue en el resto de bandas
+                del candidatos[next(iter(candidatos))]
+        return grupo_id
+
+    def _caducar(self, ahora: float) -> None:
+        limite = ahora - self.ventana
+        while self._grupos:
+            grupo_id, grupo = next(iter(self._grupos.items()))
+            if _ultima_hora(grupo) >= limite:
+                break
+            del self._grupos[grupo_id]
+            self._olvidar(grupo_id, grupo)
+
+    def _olvidar(self, grupo_id: int, grupo: _Grupo) -> None:
+        for banda, (desplazamiento, mascara) in enumerate(self._bandas):
+            clave = (banda, grupo.huella >> desplazamiento & mascara)
+            candidatos = self._indice.get(clave)
+            if candidatos is not None and candidatos.pop(grupo_id, None) is not None and not candidatos:
+                del self._indice[clave]
+
+
+def _anotar(horas: dict[int, float], clave: int, ahora: float, ventana: float, maximo: int) -> None:
+    """Apunta la hora del último mensaje de ``clave`` y descarta los que salen de la ventana.
+
+    Basta con guardar ``maximo`` claves: con esas ya se ha llegado al umbral.
+    """
+    horas.pop(clave, None)
+    horas[clave] = ahora
+    limite = ahora - ventana
+    while True:
+        antigua, hora = next(iter(horas.items()))
+        if hora >= limite and len(horas) <= maximo:
+            break
+        del horas[antigua]
+
+
+def _ultima_hora(grupo: _Grupo) -> float:
+    return next(reversed(grupo.usuarios.values()), 0.0)
+
+
+def comprobar_duplicado(update: Update, chat_id: int, user_id: int, texto: str) -> Optional[Duplicado]:
+    """Registra el mensaje en el índice, salvo que el proceso frontal ya lo haya hecho."""
+    if CAMPO_DUPLICADO in update.api_kwargs:
+        valor = update.api_kwargs[CAMPO_DUPLICADO]
+        return Duplicado(*valor) if valor else None
+    return indice_huellas.registrar(chat_id, user_id, texto)
+
+
+indice_huellas = IndiceHuellas()
@@ -0,0 +1,52 @@
+"""Comprueba la clasificación de dominios con hostnames raros sacados del texto.
+
+Los enlaces con etiquetas vacías ("a..x.com", ".x.com") llegan tal cual desde
+el texto de los mensajes y no deben romper la búsqueda en el árbol.
+
+Uso (desde la raíz del repositorio):
+    python tests/dominios.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# La base de datos se crea al importar los módulos del bot
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "prueba.db"))
+
+from urls import ArbolDominios, clasificar_urls  # noqa: E402
+
+
+def main() -> None:
+    enlaces = clasificar_urls(
+        [
+            "http://.fknbot.com/a",
+            "http://a..fknbot.com/",
+            "http://fknbot.com./",
+            "http://instagram.com../p/abc",
+            "http://../",
+            "https://example.com",
+        ]
+    )
+    assert enlaces.bloqueados == ["http://.fknbot.com/a", "http://a..fknbot.com/", "http://fknbot.com./"]
+    assert enlaces.instagram == ["http://instagram.com../p/abc"]
+    assert enlaces.otros == ["http://../", "https://example.com"]
+    print(enlaces)
+
+    arbol = ArbolDominios(["x.com"])
+    assert arbol.buscar("") is None
+    assert arbol.buscar("...") is None
+    assert arbol.buscar("a.x.com") == "bloqueado"
+    try:
+        arbol.add("..")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("add('..') debería fallar")
+    assert len(arbol) == 1
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
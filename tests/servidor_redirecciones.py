@@ -0,0 +1,118 @@
+"""Prueba el resolutor de enlaces acortados contra un servidor de redirecciones local.
+
+El servidor imita a un acortador en http://localhost:<puerto>:
+    /r/<n>     redirige n veces y acaba en https://fknbot.com/spam
+    /bucle     se redirige a sí mismo
+    /lento     tarda más que el timeout del resolutor
+    /goteo/<n> como /r/<n>, pero cada salto tarda 0,4 s (agota el presupuesto)
+    /sinhead   responde 405 a HEAD y redirige con GET a Instagram
+
+Uso (desde la raíz del repositorio):
+    python tests/servidor_redirecciones.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# La base de datos se crea al importar los módulos del bot
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "prueba.db"))
+
+from redirecciones import ResolutorRedirecciones, resolver_acortados  # noqa: E402
+from urls import clasificar_urls  # noqa: E402
+
+peticiones: list[str] = []
+
+
+async def atender(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    linea = await reader.readline()
+    while (await reader.readline()).strip():
+        pass  # cabeceras
+    metodo, ruta, _ = linea.decode().split(" ", 2)
+    peticiones.append(f"{metodo} {ruta}")
+
+    if ruta.startswith("/r/"):
+        n = int(ruta[3:])
+        destino = f"/r/{n - 1}" if n > 0 else "https://fknbot.com/spam"
+        respuesta = f"HTTP/1.1 302 Found\r\nLocation: {destino}\r\n"
+    elif ruta.startswith("/goteo/"):
+        await asyncio.sleep(0.4)
+        n = int(ruta[7:])
+        destino = f"/goteo/{n - 1}" if n > 0 else "https://fknbot.com/spam"
+        respuesta = f"HTTP/1.1 302 Found\r\nLocation: {destino}\r\n"
+    elif ruta == "/bucle":
+        respuesta = "HTTP/1.1 301 Moved Permanently\r\nLocation: /bucle\r\n"
+    elif ruta == "/lento":
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            writer.close()  # el servidor se ha cerrado antes
+            return
+        respuesta = "HTTP/1.1 200 OK\r\n"
+    elif ruta == "/sinhead" and metodo == "HEAD":
+        respuesta = "HTTP/1.1 405 Method Not Allowed\r\n"
+    elif ruta == "/sinhead":
+        respuesta = "HTTP/1.1 301 Moved Permanently\r\nLocation: https://www.instagram.com/p/abc/\r\n"
+    else:
+        respuesta = "HTTP/1.1 404 Not Found\r\n"
+    writer.write((respuesta + "Content-Length: 0\r\n\r\n").encode())
+    await writer.drain()
+    writer.close()
+
+
+async def main() -> None:
+    servidor = await asyncio.start_server(atender, "127.0.0.1", 0)
+    puerto = servidor.sockets[0].getsockname()[1]
+    base = f"http://localhost:{puerto}"
+    resolutor = ResolutorRedirecciones(acortadores=["localhost"], max_saltos=5, timeout=1, presupuesto=1.5)
+
+    async with servidor:
+        # Dos saltos por el acortador y uno fuera de él
+        assert await resolutor.resolver(f"{base}/r/2") == "https://fknbot.com/spam"
+        assert len(peticiones) == 3
+
+        # Caché: no vuelve a pedir nada
+        assert await resolutor.resolver(f"{base}/r/2") == "https://fknbot.com/spam"
+        assert len(peticiones) == 3
+
+        # La misma URL a la vez: una sola petición por salto
+        peticiones.clear()
+        finales = await resolutor.resolver_todas([f"{base}/r/1"] * 10)
+        assert finales == ["https://fknbot.com/spam"] * 10
+        assert len(peticiones) == 2, peticiones
+
+        # Límite de saltos
+        peticiones.clear()
+        assert await resolutor.resolver(f"{base}/bucle") == f"{base}/bucle"
+        assert len(peticiones) == 5
+
+        # Demasiadas redirecciones: se queda en la última URL alcanzada
+        assert await resolutor.resolver(f"{base}/r/9") == f"{base}/r/4"
+
+        # Timeout: devuelve la URL sin resolver
+        assert await resolutor.resolver(f"{base}/lento") == f"{base}/lento"
+
+        # Presupuesto agotado: se devuelve la URL sin resolver, pero la petición
+        # sigue y el siguiente mensaje con el enlace ya lo encuentra en caché
+        assert await resolutor.resolver(f"{base}/goteo/4") == f"{base}/goteo/4"
+        await asyncio.sleep(0.8)
+        assert await resolutor.resolver(f"{base}/goteo/4") == "https://fknbot.com/spam"
+
+        # Clasificación del mensaje con los destinos
+        peticiones.clear()
+        enlaces = clasificar_urls([f"{base}/r/3", f"{base}/sinhead", "https://example.com"])
+        enlaces = await resolver_acortados(enlaces, resolutor)
+        assert enlaces.bloqueados == [f"{base}/r/3"]
+        assert enlaces.instagram == ["https://www.instagram.com/p/abc/"]
+        assert enlaces.otros == ["https://example.com"]
+        print(enlaces)
+        print(f"peticiones al servidor: {peticiones}")
+
+    await resolutor.cerrar()
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
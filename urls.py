@@ -0,0 +1,163 @@
+import re
+import logging
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from telegram import Message, MessageEntity
+
+logger = logging.getLogger(__name__)
+
+# Dominios cuyos enlaces provocan el ban del usuario (incluye sus subdominios)
+DOMINIOS_BLOQUEADOS = ["bots.pb2a.com", "deepnude.us", "fknbot.com"]
+
+DOMINIOS_INSTAGRAM = ["instagram.com"]
+
+# Clasificación de un enlace o de un mensaje
+BLOQUEADO = "bloqueado"
+INSTAGRAM = "instagram"
+OTRO = "otro"
+
+_PATRON_URL = re.compile(r"https?://[^\s]+")
+_PATRON_ESQUEMA = re.compile(r"^[a-z][a-z0-9+.-]*://", re.IGNORECASE)
+
+# Clave del valor en cada nodo del árbol; no es un str, así que ninguna etiqueta coincide con ella
+_VALOR = object()
+
+
+def _etiquetas(dominio: str) -> list[str]:
+    """Etiquetas del dominio de la más general a la más concreta, sin las vacías.
+
+    "a..x.com" o ".x.com" salen del texto de los mensajes tal cual; sin las
+    etiquetas vacías se clasifican como x.com.
+    """
+    return [etiqueta for etiqueta in reversed(dominio.split(".")) if etiqueta]
+
+
+class ArbolDominios:
+    """Trie de sufijos de dominio indexado por etiquetas invertidas.
+
+    "x.fknbot.com" se recorre como com -> fknbot -> x, así que un dominio
+    registrado también cubre todos sus subdominios y el coste de la búsqueda
+    depende del número de etiquetas del hostname, no del tamaño de la lista.
+    """
+
+    __slots__ = ("_raiz", "_tamano")
+
+    def __init__(self, dominios: Iterable[str] = (), valor: str = BLOQUEADO):
+        self._raiz: dict = {}
+        self._tamano = 0
+        for dominio in dominios:
+            self.add(dominio, valor)
+
+    def __len__(self) -> int:
+        return self._tamano
+
+    def add(self, dominio: str, valor: str = BLOQUEADO) -> None:
+        etiquetas = _etiquetas(dominio.lower())
+        if not etiquetas:
+            raise ValueError(f"Dominio vacío: {dominio!r}")
+        nodo = self._raiz
+        for etiqueta in etiquetas:
+            nodo = nodo.setdefault(etiqueta, {})
+        if _VALOR not in nodo:
+            self._tamano += 1
+        nodo[_VALOR] = valor
+
+    def buscar(self, hostname: str) -> Optional[str]:
+        """Devuelve el valor del dominio registrado más específico que cubre al hostname."""
+        nodo = self._raiz
+        encontrado = None
+        for etiqueta in _etiquetas(hostname):
+            nodo = nodo.get(etiqueta)
+            if nodo is None:
+                break
+            encontrado = nodo.get(_VALOR, encontrado)
+        return encontrado
+
+
+dominios = ArbolDominios(DOMINIOS_BLOQUEADOS, BLOQUEADO)
+for _dominio in DOMINIOS_INSTAGRAM:
+    dominios.add(_dominio, INSTAGRAM)
+
+
+class EnlacesMensaje:
+    """Resultado de clasificar todos los enlaces de un mensaje."""
+
+    __slots__ = ("bloqueados", "instagram", "otros")
+
+    def __init__(self) -> None:
+        self.bloqueados: list[str] = []
+        self.instagram: list[str] = []
+        self.otros: list[str] = []
+
+    @property
+    def urls(self) -> list[str]:
+        return self.bloqueados + self.instagram + self.otros
+
+    @property
+    def clasificacion(self) -> Optional[str]:
+        """Clasificación del mensaje completo: manda el enlace más grave."""
+        if self.bloqueados:
+            return BLOQUEADO
+        if self.instagram:
+            return INSTAGRAM
+        if self.otros:
+            return OTRO
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self.bloqueados or self.instagram or self.otros)
+
+    def __repr__(self) -> str:
+        return f"EnlacesMensaje(bloqueados={self.bloqueados}, instagram={self.instagram}, otros={self.otros})"
+
+
+def extraer_urls(texto: str, entidades: Optional[dict[MessageEntity, str]] = None) -> list[str]:
+    """Extrae las URLs del texto y de las entidades del mensaje, sin repetir.
+
+    Args:
+        texto: texto del mensaje.
+        entidades: resultado de ``Message.parse_entities`` para los tipos URL y TEXT_LINK.
+    """
+    urls: dict[str, None] = dict.fromkeys(_PATRON_URL.findall(texto))
+    if entidades:
+        for entidad, texto_entidad in entidades.items():
+            if entidad.type == MessageEntity.TEXT_LINK and entidad.url:
+                urls[entidad.url] = None
+            elif entidad.type == MessageEntity.URL:
+                if not _PATRON_ESQUEMA.match(texto_entidad):
+                    texto_entidad = "http://" + texto_entidad
+                urls[texto_entidad] = None
+    return list(urls)
+
+
+def clasificar_urls(urls: Iterable[str], arbol: ArbolDominios = dominios) -> EnlacesMensaje:
+    """Clasifica cada URL como bloqueada, de Instagram u otra, parseándola una sola vez."""
+    enlaces = EnlacesMensaje()
+    for url in urls:
+        try:
+            hostname = urlsplit(url).hostname
+        except ValueError:
+            logger.error("URL inválida: %s", url)
+            continue
+        if not hostname:
+            continue
+
+        clasificacion = arbol.buscar(hostname)
+        if clasificacion == BLOQUEADO:
+            enlaces.bloqueados.append(url)
+        elif clasificacion == INSTAGRAM:
+            enlaces.instagram.append(url)
+        else:
+            enlaces.otros.append(url)
+    return enlaces
+
+
+def analizar_mensaje(message: Message) -> EnlacesMensaje:
+    """Extrae y clasifica en una sola pasada todos los enlaces de un mensaje."""
+    if message.text is None:
+        return EnlacesMensaje()
+    entidades = None
+    if message.entities:
+        entidades = message.parse_entities([MessageEntity.URL, MessageEntity.TEXT_LINK])
+    return clasificar_urls(extraer_urls(message.text, entidades))
@@ -1,35 +1,65 @@
-from typing import Optional
+from typing import Any, Coroutine, Iterator, Optional
 from uuid import uuid4
 import logging
+import time
+import types
 
-from telegram import ChatMember, ChatMemberUpdated, InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram import Chat, ChatMember, ChatMemberUpdated, InlineQueryResultArticle, InputTextMessageContent, Update
 from telegram.constants import ParseMode
+from telegram.ext import Application, BaseHandler, ConversationHandler
 
+from contextlib import contextmanager
 from functools import wraps
 
+from administradores import cache_admins
+from config import SLOW_HANDLER_MS
+from plantillas import NO_AUTORIZADO, escapar, mencion
+from registro import logger_mensajes
+from metricas import (
+    API_HANDLERS,
+    CPU_HANDLERS,
+    ERRORES_HANDLERS,
+    LATENCIA_HANDLERS,
+    Medicion,
+    medicion_actual,
+    tipo_update,
+)
+
 logger = logging.getLogger(__name__)
 
-LIST_OF_ADMINS = [906631113, 6781918338, 7565166013,  ]
+# Admins del bot: lo son en todos los chats y en los contextos sin chat (inline)
+LIST_OF_ADMINS = frozenset([906631113, 6781918338, 7565166013,  ])
 
 ADMIN_CHAT_ID = 906631113  # ID del grupo de admins
 
-def isAdmin(id):
-    """Check if the user is an admin."""
-    return id in LIST_OF_ADMINS
+async def isAdmin(id, chat: Optional[Chat] = None):
+    """Check if the user is an admin of the chat (or of the bot)."""
+    if id in LIST_OF_ADMINS:
+        return True
+    if chat is None or chat.type == Chat.PRIVATE:
+        return False
+    return id in await cache_admins.admins(chat.get_bot(), chat.id)
 
 
 def restricted(*, reply=False, custom_message=None):
+    """Solo deja pasar a los admins; al resto les responde con ``custom_message`` (texto plano)."""
+    # Se escapa una sola vez, al decorar
+    mensaje_fijo = escapar(custom_message) if custom_message else None
+
     def decorator(func):
         @wraps(func)
         async def wrapped(update: Update, context, *args, **kwargs):
             if update.effective_user is None:
                 return
             user_id = update.effective_user.id
-            if user_id not in LIST_OF_ADMINS:
-                print(f"Unauthorized access denied for {user_id}.")
+            if not await isAdmin(user_id, update.effective_chat):
+                logger_mensajes.info(
+                    "Unauthorized access denied for %s.",
+                    user_id,
+                    extra={"chat_id": update.effective_chat.id if update.effective_chat else None, "user_id": user_id},
+                )
                 try:
-                    user_mention = update.effective_user.mention_markdown_v2()
-                    message = custom_message if custom_message else f"{user_mention} la chupa"
+                    message = mensaje_fijo or NO_AUTORIZADO(usuario=mencion(update.effective_user))
                     
                     # Manejar consulta inline
                     if update.inline_query is not None:
@@ -56,7 +86,7 @@ def restricted(*, reply=False, custom_message=None):
                             parse_mode=ParseMode.MARKDOWN_V2
                         )
                 except Exception as e:
-                    logger.error(f"Error while handling response: {e}")
+                    logger.error("Error while handling response: %s", e)
                     return
                 return
             return await func(update, context, *args, **kwargs)
@@ -65,6 +95,119 @@ def restricted(*, reply=False, custom_message=None):
     return decorator
 
 
+@types.coroutine
+def _medir_cpu(coro: Coroutine, medicion: Medicion):
+    """Ejecuta la corrutina paso a paso sumando el tiempo de CPU de cada paso.
+
+    Cada send() corre la corrutina hasta su siguiente await, así que solo se
+    cuenta el tiempo en el que ejecuta este manejador y no el de las demás
+    tareas que avanzan mientras espera.
+    """
+    enviar: Any = coro.send
+    valor: Any = None
+    while True:
+        inicio = time.thread_time()
+        try:
+            futuro = enviar(valor)
+        except StopIteration as fin:
+            medicion.cpu += time.thread_time() - inicio
+            return fin.value
+        except BaseException:
+            medicion.cpu += time.thread_time() - inicio
+            raise
+        medicion.cpu += time.thread_time() - inicio
+        try:
+            valor = yield futuro
+            enviar = coro.send
+        except GeneratorExit:
+            coro.close()
+            raise
+        except BaseException as e:
+            valor = e
+            enviar = coro.throw
+
+
+@contextmanager
+def seccion(nombre: str) -> Iterator[None]:
+    """Mide una parte de un manejador instrumentado; aparece en el log de manejadores lentos."""
+    medicion = medicion_actual.get()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.secciones[nombre] = medicion.secciones.get(nombre, 0.0) + time.perf_counter() - inicio
+
+
+def instrumentado(nombre: Optional[str] = None, *, umbral_ms: float = SLOW_HANDLER_MS):
+    """Mide el tiempo total, el de espera de la Bot API y el de CPU de un manejador.
+
+    Los manejadores que tardan más de ``umbral_ms`` se registran en el log con el
+    tipo de update, el chat y el desglose por secciones.
+    """
+    def decorator(func):
+        etiqueta = nombre or func.__name__
+
+        @wraps(func)
+        async def wrapped(update, context, *args, **kwargs):
+            medicion = Medicion()
+            token = medicion_actual.set(medicion)
+            inicio = time.perf_counter()
+            try:
+                return await _medir_cpu(func(update, context, *args, **kwargs), medicion)
+            except Exception:
+                ERRORES_HANDLERS.labels(etiqueta).inc()
+                raise
+            finally:
+                total = time.perf_counter() - inicio
+                medicion_actual.reset(token)
+                LATENCIA_HANDLERS.labels(etiqueta).observe(total)
+                API_HANDLERS.labels(etiqueta).observe(medicion.api)
+                CPU_HANDLERS.labels(etiqueta).observe(medicion.cpu)
+                if total * 1000 > umbral_ms:
+                    _registrar_lento(etiqueta, update, total, medicion)
+
+        return wrapped
+
+    return decorator
+
+
+def _registrar_lento(nombre: str, update: object, total: float, medicion: Medicion) -> None:
+    tipo = tipo_update(update) if isinstance(update, Update) else type(update).__name__
+    chat = update.effective_chat if isinstance(update, Update) else None
+    secciones = ", ".join(f"{s}={1000 * t:.1f}ms" for s, t in medicion.secciones.items())
+    logger.warning(
+        "Manejador lento %s: total %.1fms, API %.1fms, CPU %.1fms%s [update %s, chat %s]",
+        nombre,
+        1000 * total,
+        1000 * medicion.api,
+        1000 * medicion.cpu,
+        f" ({secciones})" if secciones else "",
+        tipo,
+        chat.id if chat else None,
+    )
+
+
+def _instrumentar(handler: BaseHandler) -> None:
+    if isinstance(handler, ConversationHandler):
+        for interno in handler.entry_points + handler.fallbacks:
+            _instrumentar(interno)
+        for estados in handler.states.values():
+            for interno in estados:
+                _instrumentar(interno)
+        return
+    handler.callback = instrumentado()(handler.callback)
+
+
+def instrumentar_handlers(application: Application) -> None:
+    """Aplica ``instrumentado`` a todos los manejadores ya añadidos a la aplicación."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrumentar(handler)
+
+
 def extract_status_change(
     chat_member_update: ChatMemberUpdated,
 ) -> Optional[tuple[bool, bool]]: